@@ -0,0 +1,117 @@
+# THIS SCRIPT MEASURES HOW FAST THE LYRICS ARE EXTRACTED FROM SAVED GENIUS.COM PAGES
+# THE PAGES ARE READ FROM A FOLDER OF HTML FIXTURES, WHICH CAN BE FILLED FROM THE RESPONSE CACHE
+
+# Imports
+import os
+import re
+import glob
+import json
+import time
+import sqlite3
+import datetime
+from bs4 import BeautifulSoup
+
+# My classes
+from data_gathering_helpers.lyrics_parser import parse_lyrics_pages, lyrics_class
+
+def parse_lyrics_html_full_page(page_html):
+    # Previous extraction, building the whole page with the builtin parser, used as reference
+    html = BeautifulSoup(page_html, "html.parser")
+    divs = html.find_all("div", class_=lyrics_class)
+    lyrics = "\n".join([' '.join(div.stripped_strings).replace(' ]', ']').replace('[ ', '[') for div in divs])
+    lyrics = re.sub(r'(\[.*?\])*', '', lyrics)
+    lyrics = re.sub('\n{2}', '\n', lyrics)
+    return lyrics.strip("\n")
+
+def export_cached_pages(cache_path, fixtures_path):
+    '''
+    This function saves the lyrics pages of the response cache as html fixtures
+    :param cache_path: The path of the response cache
+    :type cache_path: str
+    :param fixtures_path: The folder of the fixtures
+    :type fixtures_path: str
+
+    :return: The number of pages saved
+    :rtype: int
+    '''
+    os.makedirs(fixtures_path, exist_ok=True)
+    connection = sqlite3.connect(cache_path)
+    rows = connection.execute("SELECT url, body FROM responses WHERE url LIKE 'https://genius.com/%'").fetchall()
+    connection.close()
+    for url, body in rows:
+        name = url[len("https://genius.com/"):].replace("/", "_")
+        with open(os.path.join(fixtures_path, name + ".html"), "w") as file:
+            file.write(body)
+    return len(rows)
+
+def time_parser(pages, parse):
+    # Time one parsing function over every page
+    start = time.perf_counter()
+    lyrics = parse(pages)
+    elapsed = time.perf_counter() - start
+    return lyrics, {
+        "seconds": elapsed,
+        "pages_per_sec": len(pages) / elapsed if elapsed > 0 else None,
+        "ms_per_page": elapsed / len(pages) * 1000 if len(pages) > 0 else None,
+    }
+
+def run_benchmarks(pages, workers=4):
+    '''
+    This function benchmarks the lyrics extraction on the given pages
+    :param pages: The html of the song pages
+    :type pages: list
+    :param workers: The number of processes of the pooled run
+    :type workers: int
+
+    :return: The results of every parser, and whether they extract the same lyrics
+    :rtype: dict
+    '''
+    reference, results_full = time_parser(pages, lambda pages: [parse_lyrics_html_full_page(page) for page in pages])
+    builtin, results_builtin = time_parser(pages, lambda pages: parse_lyrics_pages(pages, parser="html.parser"))
+    fast, results_fast = time_parser(pages, lambda pages: parse_lyrics_pages(pages))
+    pooled, results_pooled = time_parser(pages, lambda pages: parse_lyrics_pages(pages, workers=workers))
+    return {
+        "date": datetime.datetime.now().isoformat(),
+        "pages": len(pages),
+        "workers": workers,
+        "full_page_html_parser": results_full,
+        "strained_html_parser": results_builtin,
+        "strained_default_parser": results_fast,
+        "strained_default_parser_pool": results_pooled,
+        # Pages where a parser doesn't agree with the full page reference
+        "mismatches": {
+            "strained_html_parser": sum(a != b for a, b in zip(reference, builtin)),
+            "strained_default_parser": sum(a != b for a, b in zip(reference, fast)),
+            "strained_default_parser_pool": sum(a != b for a, b in zip(reference, pooled)),
+        },
+    }
+
+if __name__ == "__main__":
+    ### CONFIG ###
+    # Folder of the saved song pages
+    fixtures_path = "lyrics_html_fixtures/"
+    # Response cache to fill the fixtures from (None only uses the existing fixtures)
+    response_cache_path = "genius_response_cache.sqlite"
+    # Number of processes of the pooled run
+    workers = 4
+    ##############
+    if response_cache_path is not None and os.path.exists(response_cache_path):
+        print(f"Exported {export_cached_pages(response_cache_path, fixtures_path)} pages from {response_cache_path}")
+    pages = []
+    for fixture in sorted(glob.glob(os.path.join(fixtures_path, "*.html"))):
+        with open(fixture, "r") as file:
+            pages.append(file.read())
+    if len(pages) == 0:
+        print(f"No html fixtures found in {fixtures_path}")
+    else:
+        results = run_benchmarks(pages, workers)
+
+        # Save the results, using the time and date as part of the filename
+        if not os.path.exists("benchmarks"):
+            os.mkdir("benchmarks")
+        now = datetime.datetime.now()
+        output_path = f"benchmarks/lyrics_parsing_{now.strftime('%Y-%m-%d_%H-%M-%S')}.json"
+        with open(output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(json.dumps(results, indent=4))
+        print(f"Results saved to {output_path}")
@@ -0,0 +1,160 @@
+# THIS SCRIPT MEASURES THE THROUGHPUT OF THE SENTIMENT SCORING PIPELINE
+# WITH THE "stub" BACKEND IT RUNS OFFLINE, WITHOUT DOWNLOADING ANY MODEL
+
+# Imports
+import os
+import glob
+import json
+import time
+import resource
+import datetime
+import numpy as np
+import pandas as pd
+
+# My classes
+from sentiment_analysis import split_lyrics, filter_lyrics, prepare_lyrics, SentimentScorer
+from sentiment_analysis_helpers.backends import create_backend
+
+class TimedBackend:
+    def __init__(self, backend):
+        # Wrap a backend and record how long every chunk takes
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.chunk_latencies = []
+
+    def __call__(self, chunks, candidate_labels, batch_size=None):
+        start = time.perf_counter()
+        sentiments = self.backend(chunks, candidate_labels=candidate_labels, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        # A batched call is spread evenly over its chunks
+        total_chunks = 1 if isinstance(chunks, str) else max(len(chunks), 1)
+        self.chunk_latencies.extend([elapsed / total_chunks] * total_chunks)
+        return sentiments
+
+def get_peak_rss_mb():
+    # Peak resident memory of this process (ru_maxrss is in kilobytes on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def benchmark_split(lyrics, chunk_size):
+    # Time the chunking of every song
+    start = time.perf_counter()
+    total_chunks = sum(len(split_lyrics(text, chunk_size)) for text in lyrics)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "songs_per_sec": len(lyrics) / elapsed if elapsed > 0 else None,
+        "chunks_per_sec": total_chunks / elapsed if elapsed > 0 else None,
+        "chunks": total_chunks,
+    }
+
+def benchmark_filter(lyrics):
+    # Time the removal of love and the singing words
+    start = time.perf_counter()
+    _, removed_counts = filter_lyrics(lyrics, remove_love=True, remove_singing=True)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "songs_per_sec": len(lyrics) / elapsed if elapsed > 0 else None,
+        "removed_words": sum(removed_counts.values()),
+    }
+
+def benchmark_scoring(data_path, labels, mapping, backend, batch_size, chunk_size):
+    # Score the file the same way perform_sentiment_analysis does, with a timed backend
+    scorer = SentimentScorer(labels, mapping, batch_size=batch_size, chunk_size=chunk_size, backend=backend)
+    scorer.classifier = TimedBackend(create_backend(backend, mapping=mapping))
+    start = time.perf_counter()
+    dataframe = pd.read_csv(data_path)
+    dataframe = prepare_lyrics(dataframe, remove_love=False, remove_singing=True)
+    dataframe = scorer.add_score_columns(dataframe)
+    dataframe = scorer.score_rows(dataframe)
+    elapsed = time.perf_counter() - start
+    scorer.close()
+    latencies = np.array(scorer.classifier.chunk_latencies)
+    return {
+        "seconds": elapsed,
+        "songs_per_sec": len(dataframe) / elapsed if elapsed > 0 else None,
+        "chunks_per_sec": len(latencies) / elapsed if elapsed > 0 else None,
+        "chunks": len(latencies),
+        "p50_chunk_latency_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) > 0 else None,
+        "p95_chunk_latency_ms": float(np.percentile(latencies, 95) * 1000) if len(latencies) > 0 else None,
+    }
+
+def run_benchmarks(data_paths, labels, mapping, backend="stub", batch_size=16, chunk_size=512):
+    '''
+    This function benchmarks every stage of the pipeline on every file
+    :param data_paths: The paths of the csv files with lyrics
+    :type data_paths: list
+    :param backend: The scoring backend, "stub" runs offline
+    :type backend: str
+
+    :return: The results of every stage for every file
+    :rtype: dict
+    '''
+    results = {
+        "date": datetime.datetime.now().isoformat(),
+        "backend": backend,
+        "batch_size": batch_size,
+        "chunk_size": chunk_size,
+        "datasets": {},
+    }
+    for data_path in data_paths:
+        print(f"Benchmarking {data_path}...")
+        dataframe = pd.read_csv(data_path)
+        lyrics = dataframe["Lyrics" if "Lyrics" in dataframe.columns else "lyrics"].fillna("")
+        results["datasets"][data_path] = {
+            "songs": len(dataframe),
+            "split_lyrics": benchmark_split(lyrics, chunk_size),
+            "filter_lyrics": benchmark_filter(lyrics),
+            "perform_sentiment_analysis": benchmark_scoring(data_path, labels, mapping, backend, batch_size, chunk_size),
+        }
+    results["peak_rss_mb"] = get_peak_rss_mb()
+    return results
+
+def compare_results(results, previous):
+    # Print the change of every throughput compared to a previous run
+    for data_path, stages in results["datasets"].items():
+        if data_path not in previous["datasets"]:
+            continue
+        for stage, values in stages.items():
+            if not isinstance(values, dict):
+                continue
+            old = previous["datasets"][data_path].get(stage, {}).get("songs_per_sec")
+            new = values.get("songs_per_sec")
+            if old and new:
+                print(f"{data_path} {stage}: {new:.1f} songs/sec ({(new - old) / old * 100:+.1f}%)")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB (previous {previous['peak_rss_mb']:.1f} MB)")
+
+if __name__ == "__main__":
+    ### CONFIG ###
+    my_labels = ['very negative', 'negative', 'neutral', 'positive', 'very positive']
+    mapping = {
+        'very negative': -1,
+        'negative': -0.5,
+        'neutral': 0,
+        'positive': 0.5,
+        'very positive': 1
+    }
+    # "stub" runs without a model, any other backend of sentiment_analysis.py can be measured too
+    backend = "stub"
+    batch_size = 16
+    chunk_size = 512
+    data_paths = sorted(glob.glob("artist_lyrics/*.csv")) + ["beatles_data/beatles_data.csv"]
+    # Previous benchmark file to compare against (None skips the comparison)
+    previous_path = None
+    ##############
+    results = run_benchmarks(data_paths, my_labels, mapping, backend, batch_size, chunk_size)
+
+    # Save the results, using the time and date as part of the filename
+    if not os.path.exists("benchmarks"):
+        os.mkdir("benchmarks")
+    now = datetime.datetime.now()
+    output_path = f"benchmarks/benchmark_{now.strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    with open(output_path, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"Results saved to {output_path}")
+
+    # Compare with a previous run
+    if previous_path is not None:
+        with open(previous_path, "r") as file:
+            previous = json.load(file)
+        compare_results(results, previous)
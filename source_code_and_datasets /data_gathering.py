@@ -2,17 +2,16 @@
 from tqdm import tqdm
 import os
 import json
-import re
+import asyncio
 import pandas as pd
 
 # My classes
 from data_gathering_helpers.genius_api import GeniusSearch, get_lyrics
+from data_gathering_helpers.response_cache import NotCachedError
 from data_gathering_helpers.beatles_specific import process_beatles_data
-
-def normalize_song_name(song_name):
-    """Normalize the song name by removing common version descriptors."""
-    pattern = re.compile(r'\(.*?\)|\[.*?\]|{.*?}| - .*|$')
-    return pattern.sub('', song_name).strip().lower()
+from data_gathering_helpers.lyrics_checkpoint import LyricsCheckpoint
+from data_gathering_helpers.corpus_store import write_corpus
+from data_gathering_helpers.duplicate_songs import cluster_songs
 
 def confirm_with_user(list, limit, file_path, initial_page, final_message = None):
     print("The following artists will be queried for lyrics:")
@@ -43,8 +42,8 @@ def check_path_is_full_and_confirm(path, artist_name, suffix):
         # Save a backup of the file
         run_number = get_run_number(path)
         if not os.path.exists(path + "backup" + f"/run_{run_number}"):
-            os.mkdir(path + "backup" + f"/run_{run_number}")
-        os.rename(total_path, path + "backup/" + f"run_{run_number}/{artist_name.lower().replace(' ', '_')}_songs.json")
+            os.makedirs(path + "backup" + f"/run_{run_number}")
+        os.rename(total_path, path + "backup/" + f"run_{run_number}/{artist_name.lower().replace(' ', '_')}{suffix}")
     return True
     
 def get_run_number(file_path):
@@ -53,23 +52,113 @@ def get_run_number(file_path):
         run_number += 1
     return run_number
 
-def filter_repeat_songs(file_path, filtered_file_path, artist):
-    # Open the artits song file
-    with open(file_path + artist.lower().replace(" ", "_") + "_songs.json", "r") as file:
-        songs_json = json.load(file)
-    # Create a dictionary to store the filtered songs
-    filtered_songs = {}
-    seen_song_names = set()
-    for song_id, song_data in songs_json.items():
-        normalized_name = normalize_song_name(song_data["song_name"])
-        if normalized_name not in seen_song_names:
-            filtered_songs[song_id] = song_data
-            seen_song_names.add(normalized_name)
-    # Save the filtered songs
-    with open(filtered_file_path + artist.lower().replace(" ", "_") + "_songs.json", "w") as file:
-        json.dump(filtered_songs, file, indent=4)
+def filter_repeat_songs(file_path, filtered_file_path, artists, min_similarity=0.9):
+    '''
+    This function removes the other versions of the same song (live, remaster, demo...) from the whole catalog at once
+    :param file_path: The folder of the artist song files
+    :type file_path: str
+    :param filtered_file_path: The folder of the filtered song files
+    :type filtered_file_path: str
+    :param artists: The artists of the catalog
+    :type artists: list
+    :param min_similarity: Song names with at least this similarity are versions of the same song (None only removes equal names)
+    :type min_similarity: float
+
+    :return: A dictionary where keys are the song ids and values are the id of the song kept for them
+    :rtype: dict
+    '''
+    # Open the song file of every artist
+    songs_by_artist = {}
+    for artist in artists:
+        with open(file_path + artist.lower().replace(" ", "_") + "_songs.json", "r") as file:
+            songs_by_artist[artist] = json.load(file)
+    catalog = pd.DataFrame([
+        {"song_id": song_id, "song_name": song_data["song_name"], "artist_name": artist}
+        for artist, songs_json in songs_by_artist.items() for song_id, song_data in songs_json.items()
+    ], columns=["song_id", "song_name", "artist_name"])
+    # Group the versions of every song and keep one of them
+    clusters = cluster_songs(catalog, min_similarity)
+    song_clusters = dict(zip(clusters["song_id"], clusters["canonical_id"]))
+    # Save the filtered songs of every artist
+    for artist, songs_json in songs_by_artist.items():
+        filtered_songs = {song_id: song_data for song_id, song_data in songs_json.items() if song_clusters[song_id] == song_id}
+        print(f"{artist}: kept {len(filtered_songs)} of {len(songs_json)} songs.")
+        with open(filtered_file_path + artist.lower().replace(" ", "_") + "_songs.json", "w") as file:
+            json.dump(filtered_songs, file, indent=4)
+    # Save which song was kept for every removed version
+    with open(filtered_file_path + "song_clusters.json", "w") as file:
+        json.dump(song_clusters, file, indent=4)
+    return song_clusters
+
+
+def load_existing_lyrics(lyrics_path, df):
+    '''
+    This function gets the lyrics already present in a lyrics csv
+    :param lyrics_path: The path of the lyrics csv
+    :type lyrics_path: str
+    :param df: The songs of the artist, indexed by song id
+    :type df: pd.DataFrame
 
+    :return: A dictionary where keys are the song ids and values are the lyrics
+    :rtype: dict
+    '''
+    if not os.path.exists(lyrics_path):
+        return {}
+    existing = pd.read_csv(lyrics_path)
+    existing = existing[existing["Lyrics"].notna()]
+    if "song_id" in existing.columns:
+        return {str(song_id): lyrics for song_id, lyrics in zip(existing["song_id"], existing["Lyrics"])}
+    # Older files have no song id, so match them by song name
+    lyrics_by_name = dict(zip(existing["song_name"], existing["Lyrics"]))
+    return {str(song_id): lyrics_by_name[name] for song_id, name in zip(df.index, df["song_name"]) if name in lyrics_by_name}
 
+def gather_artist_lyrics(df, genius, checkpoint, existing_lyrics=None, async_settings=None, artist=""):
+    '''
+    This function gathers the lyrics of every song, saving each song to the checkpoint as it arrives
+    :param df: The songs of the artist, indexed by song id
+    :type df: pd.DataFrame
+    :param genius: The client reused for every song
+    :type genius: GeniusSearch
+    :param checkpoint: The checkpoint holding the songs already gathered
+    :type checkpoint: LyricsCheckpoint
+    :param existing_lyrics: Lyrics that don't need to be gathered again, by song id
+    :type existing_lyrics: dict
+    :param async_settings: The settings of the asyncio client, None uses the given client
+    :type async_settings: dict
+
+    :return: The lyrics of every song, in the order of the dataframe
+    :rtype: list
+    '''
+    # Songs gathered with their page path don't need another details request
+    paths = [path if isinstance(path, str) else None for path in df["path"]] if "path" in df.columns else [None] * len(df)
+    # Only the songs without lyrics in the checkpoint or the existing file are fetched
+    known_lyrics = dict(existing_lyrics) if existing_lyrics is not None else {}
+    known_lyrics.update(checkpoint.lyrics)
+    missing = [(song_id, path) for song_id, path in zip(df.index, paths) if str(song_id) not in known_lyrics]
+    if len(known_lyrics) > 0:
+        print(f"Resuming {artist}: {len(df) - len(missing)} songs already gathered, {len(missing)} to go.")
+    # Failed requests (None) are not saved, so they are tried again next time
+    def save_song(song_id, lyrics):
+        if lyrics is not None:
+            checkpoint.save(song_id, lyrics)
+    if async_settings is not None:
+        # The asyncio client fetches the lyrics of every song concurrently
+        print(f"Gathering lyrics for {artist}...")
+        # Only imported here, so aiohttp is only needed by the asyncio client
+        from data_gathering_helpers.async_genius_api import gather_lyrics
+        asyncio.run(gather_lyrics([song_id for song_id, _ in missing], [path for _, path in missing], save_song, **async_settings))
+    else:
+        # Create a pbar object which will iterate over the missing songs
+        pbar = tqdm(missing, total=len(missing))
+        for song_id, path in pbar:
+            pbar.set_description(f"Artist: {artist}")
+            # Offline, the songs missing from the response cache are left for the next run
+            try:
+                save_song(song_id, get_lyrics(song_id, genius, path))
+            except NotCachedError as error:
+                print(error)
+    known_lyrics.update(checkpoint.lyrics)
+    return [known_lyrics.get(str(song_id)) for song_id in df.index]
 
 if __name__ == "__main__":
     ################################################
@@ -84,12 +173,34 @@ if __name__ == "__main__":
     file_path_lyrics = "artist_lyrics/"
     # See if the user wants to filter the songs for no repeat. 
     filter_repeat = True
+    # Song names with at least this similarity are versions of the same song (None only removes equal names)
+    repeat_min_similarity = 0.9
     
     ############## ADDITIONAL CONFIG ##############
     # Set the limit of songs to gather for each artist
     limit = 1
     # Set the initial page to start the search
     initial_page = 1
+    # Use the asyncio client (pooled connections, token bucket rate limit) instead of GeniusSearch
+    use_async_client = False
+    # Requests per second allowed by the rate limiter of the asyncio client
+    requests_per_second = 2
+    # Number of song pages GeniusSearch downloads ahead in parallel (None fetches them one by one)
+    prefetch_pages = None
+    # Number of processes parsing the lyrics pages of the asyncio client (None parses them in the event loop)
+    parse_workers = None
+    # On-disk cache of the API and lyrics page responses (None disables it)
+    response_cache_path = "genius_response_cache.sqlite"
+    # Only answer from the response cache, without touching the network
+    offline = False
+    # Only fetch the songs without lyrics in the existing lyrics csv
+    fetch_missing_only = False
+    # Folder of the per-song lyrics checkpoints used to resume an interrupted run
+    file_path_checkpoints = "artist_lyrics/checkpoints/"
+    # Parquet corpus store the lyrics are also written to, one folder per artist (None only writes the csv files)
+    corpus_path = "corpus/lyrics"
+    # Corpus store of the beatles data with the composers (None only writes the csv file)
+    beatles_corpus_path = "corpus/beatles"
     ################ CONFIGURATION ################
     ################################################
     # Query user to ensure the artist names are correct and they want to proceed
@@ -97,62 +208,75 @@ if __name__ == "__main__":
     # Create the tqdm object
     pbar = tqdm(artist_names, total=len(artist_names))
 
+    # Create one client, reused for every artist and song
+    genius = GeniusSearch(cache_path=response_cache_path, offline=offline)
+
     # Perform a loop over the artists names to gather the JSON data
     # This json data contains: song id (from genius), song name, 
     # artist name, the artist id, the release date, and the album name
+    artists_to_gather = []
     for artist_name in pbar:
         pbar.set_description(f"Artist: {artist_name}") # Update the progress bar with the artist name
         # Check if the file already exists and if the user wants to overwrite it
         if not check_path_is_full_and_confirm(file_path, artist_name, "_songs.json"):
             continue
-        genius = GeniusSearch() # Create a GeniusSearch object
+        # The asyncio client gathers all the artists together after the checks
+        if use_async_client:
+            artists_to_gather.append(artist_name)
+            continue
         # Search and save the artist ids
-        genius.search_and_save_artist_ids(artist_name, file_path, limit=limit, initial_page=initial_page, pbar=pbar)
+        genius.search_and_save_artist_ids(artist_name, file_path, limit=limit, initial_page=initial_page, pbar=pbar, prefetch_pages=prefetch_pages)
+    if use_async_client and len(artists_to_gather) > 0:
+        from data_gathering_helpers.async_genius_api import gather_artists
+        asyncio.run(gather_artists(artists_to_gather, file_path, limit=limit, initial_page=initial_page, requests_per_second=requests_per_second, cache_path=response_cache_path, offline=offline))
 
     print("ID gathering finished.")
         
     # Filter the song for no repeat songs using the normalized song name
     if filter_repeat:
         print("Filtering repeat songs...")
-        pbar = tqdm(artist_names, total=len(artist_names))
-        for artist in pbar:
-            pbar.set_description(f"Artist: {artist}")
-            filter_repeat_songs(file_path, filtered_file_path, artist)
+        filter_repeat_songs(file_path, filtered_file_path, artist_names, repeat_min_similarity)
         # Set the correct path to start the lyrics gathering
         file_path = filtered_file_path
         print("Filtering finished.")
 
     # Using the file_path, file_path_lyrics, and get_lyrics function, gather the lyrics for each song
+    async_settings = None
+    if use_async_client:
+        async_settings = {"requests_per_second": requests_per_second, "cache_path": response_cache_path, "offline": offline, "parse_workers": parse_workers}
     for artist in artist_names:
-        # Check if the file already exists and if the user wants to overwrite it
-        if not check_path_is_full_and_confirm(file_path_lyrics, artist, "_lyrics.csv"):
-            continue
+        lyrics_path = file_path_lyrics + artist.lower().replace(" ", "_") + "_lyrics.csv"
         # Open the artist songs file
         with open(file_path + artist.lower().replace(" ", "_") + "_songs.json", "r") as file:
             songs_json = json.load(file)
         # Create a dataframe to store all the data
         df = pd.DataFrame(songs_json).T
-        # Create a pbar object which will iterate over the dataframe
-        pbar = tqdm(df.iterrows(), total=len(df))
-        # Create an empty list to store the lyrics
-        lyrics_list = []
-        # Iterate over the dataframe
-        for index, row in pbar:
-            pbar.set_description(f"Artist: {artist}")
-            # Get the song id, which is the index
-            lyrics = get_lyrics(index, GeniusSearch())
-            lyrics_list.append(lyrics)
+        # Keep the lyrics of the existing file before it is moved to the backup
+        existing_lyrics = load_existing_lyrics(lyrics_path, df) if fetch_missing_only else {}
+        # Check if the file already exists and if the user wants to overwrite it
+        if not check_path_is_full_and_confirm(file_path_lyrics, artist, "_lyrics.csv"):
+            continue
+        # Gather the lyrics, every song is saved to the checkpoint as soon as it is fetched
+        checkpoint = LyricsCheckpoint(file_path_checkpoints + artist.lower().replace(" ", "_") + "_lyrics.jsonl")
+        lyrics_list = gather_artist_lyrics(df, genius, checkpoint, existing_lyrics, async_settings, artist)
         # Add the lyrics to the dataframe
         df["Lyrics"] = lyrics_list
+        # Keep the song id so later runs can tell which songs are missing
+        df.insert(0, "song_id", df.index)
         # Save the dataframe to a csv file
-        df.to_csv(file_path_lyrics + artist.lower().replace(" ", "_") + "_lyrics.csv", index=False)
+        df.to_csv(lyrics_path, index=False)
+        # Replace the songs of the artist in the corpus store
+        if corpus_path is not None:
+            write_corpus(df, corpus_path, artist)
+        # The csv now holds every song, so the checkpoint is no longer needed
+        checkpoint.remove()
     print("Lyrics gathering finished.")
 
     if "The Beatles" not in  artist_names:
         print("Data gathering finished.")
     else:
         # Start beatles specific data processing
-        process_beatles_data(file_path_lyrics)
+        process_beatles_data(file_path_lyrics, beatles_corpus_path)
         print("Data gathering finished.")
 
 
@@ -0,0 +1,257 @@
+# imports
+import asyncio
+import json
+import time
+import aiohttp
+
+# My classes
+from data_gathering_helpers.genius_api import pick_artist_id, get_album_name_from_details, get_retry_wait
+from data_gathering_helpers.lyrics_parser import parse_lyrics_html, create_parse_executor
+from data_gathering_helpers.response_cache import ResponseCache
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        # Requests per second and the size of the allowed burst
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        # Time before which no request may start (set by 429 responses)
+        self.blocked_until = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Wait until a token is available and take it
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                # Honour a Retry-After pause
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                # Refill the bucket with the time passed since the last request
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        # Stop every request for the given number of seconds
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class AsyncGeniusSearch:
+    def __init__(self, token=None, requests_per_second=2, burst=5, max_concurrency=10, max_artist_concurrency=2, max_retries=5, api_url="https://api.genius.com", web_url="https://genius.com", cache_path=None, cache_ttl=7 * 24 * 3600, cache_max_bytes=2 * 1024 ** 3, offline=False, parse_workers=None):
+        # If the token is None, get it from the config file
+        if token is None:
+            with open("config.json", "r") as file:
+                token = json.load(file)["token"]
+        self.token = token
+        # Create the headers for the request
+        self.headers = {
+            "Authorization": "Bearer " + self.token
+        }
+        # The urls can point at a local mock server for testing
+        self.api_url = api_url
+        self.web_url = web_url
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        # Bound the number of requests in flight and of artists processed together
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.artist_semaphore = asyncio.Semaphore(max_artist_concurrency)
+        self.session = None
+        # Details request of every song, shared by the album, path and lyrics lookups
+        self.song_details = {}
+        # Open the on-disk response cache if a path is given (offline only answers from it)
+        self.cache = None
+        if cache_path is not None:
+            self.cache = ResponseCache(cache_path, ttl=cache_ttl, max_bytes=cache_max_bytes, offline=offline)
+        # Parse the lyrics pages in a process pool so parsing doesn't block the requests
+        # (None parses them in the event loop)
+        self.parse_executor = None
+        if parse_workers is not None:
+            self.parse_executor = create_parse_executor(parse_workers)
+
+    async def __aenter__(self):
+        # One session, so every request reuses the pooled connections
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *args):
+        await self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown()
+
+    async def fetch(self, url, headers=None, as_json=True):
+        '''
+        This function fetches a url, respecting the rate limit and retrying on 429 responses
+        :param url: The url to fetch
+        :type url: str
+        :param headers: The headers of the request
+        :type headers: dict
+        :param as_json: Whether to decode the response as json or return the text
+        :type as_json: bool
+
+        :return: The decoded response, None if the server answered with an error
+        :rtype: dict
+        '''
+        # Answer from the response cache without using the rate limit if possible
+        entry = None
+        if self.cache is not None:
+            body, entry, headers = self.cache.lookup(url, headers)
+            if body is not None:
+                return json.loads(body) if as_json else body
+        for attempt in range(self.max_retries):
+            await self.rate_limiter.acquire()
+            async with self.semaphore:
+                try:
+                    async with self.session.get(url, headers=headers) as response:
+                        # Too many requests: wait for the time asked by the server
+                        if response.status in [429, 503]:
+                            self.rate_limiter.pause(get_retry_wait(response.headers.get("Retry-After"), attempt))
+                            continue
+                        # The body is only read for a 200, a 304 is answered from the cache
+                        text = await response.text() if response.status == 200 else None
+                        if self.cache is not None:
+                            text = self.cache.update(url, entry, response.status, text, response.headers)
+                        # If the response status code is not 200 (or a 304 of a cached response), return None
+                        if text is None:
+                            return None
+                        return json.loads(text) if as_json else text
+                except aiohttp.ClientError:
+                    # Back off before retrying a failed connection
+                    await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"Request to {url} still failed after {self.max_retries} attempts")
+
+    async def get_artist_id(self, artist_name):
+        # Search the artist and pick the id from the hits
+        response = await self.fetch(f"{self.api_url}/search?q={artist_name}", self.headers)
+        if response is None:
+            raise RuntimeError(f"The search for {artist_name} failed")
+        return pick_artist_id(response["response"]["hits"], artist_name)
+
+    async def fetch_song_details(self, song_id):
+        # Fetch the song object from the song endpoint
+        response = await self.fetch(f"{self.api_url}/songs/{song_id}", self.headers)
+        if response is None:
+            return None
+        return response["response"]["song"]
+
+    async def get_song_details(self, song_id):
+        # Fetch every song only once, concurrent callers wait for the same request
+        if song_id not in self.song_details:
+            self.song_details[song_id] = asyncio.ensure_future(self.fetch_song_details(song_id))
+        details = await self.song_details[song_id]
+        # Forget failed requests so they are tried again
+        if details is None:
+            self.song_details.pop(song_id, None)
+        return details
+
+    async def get_album_name(self, song_id):
+        # Get the album name from the song details
+        return get_album_name_from_details(await self.get_song_details(song_id))
+
+    async def get_all_artist_songs(self, artist_id, results_per_page=50, results_limit=None, initial_page=1):
+        '''
+        This function gets the songs of an artist, fetching the album names concurrently
+        :param artist_id: The Genius id of the artist
+        :type artist_id: int
+
+        :return: A dictionary where keys are the song ids and value is a dict
+        with song names, artist name, song title, release date components
+        :rtype: dict
+        '''
+        dictionary = {}
+        page = initial_page
+        while results_limit is None or len(dictionary) < results_limit:
+            url = f"{self.api_url}/artists/{artist_id}/songs?per_page={results_per_page}&page={page}"
+            response = await self.fetch(url, self.headers)
+            # Stop at a failed or empty page
+            if response is None or len(response["response"]["songs"]) == 0:
+                break
+            for song in response["response"]["songs"]:
+                if song["primary_artist"]["id"] != artist_id:
+                    continue
+                if results_limit is not None and len(dictionary) >= results_limit:
+                    break
+                dictionary[song["id"]] = {
+                    "song_name": song["title"],
+                    "artist_name": song["primary_artist"]["name"],
+                    "artist_id": artist_id,
+                    "release_date": song.get("release_date_components"),
+                    "path": song.get("path"),
+                }
+            page += 1
+        # Fetch the details of every song at once, one request per song
+        song_ids = list(dictionary.keys())
+        all_details = await asyncio.gather(*[self.get_song_details(song_id) for song_id in song_ids])
+        for song_id, details in zip(song_ids, all_details):
+            # A failed request must not be saved as a song without an album
+            if details is None:
+                raise RuntimeError(f"The details of song {song_id} could not be fetched")
+            dictionary[song_id]["album_name"] = get_album_name_from_details(details)
+            dictionary[song_id]["path"] = dictionary[song_id]["path"] or details.get("path")
+            dictionary[song_id]["release_date"] = dictionary[song_id]["release_date"] or details.get("release_date_components")
+        return dictionary
+
+    async def search_and_save_artist_ids(self, artist_name, file_path, limit=None, initial_page=1):
+        # Only a few artists are gathered at the same time
+        async with self.artist_semaphore:
+            artist_id, name = await self.get_artist_id(artist_name)
+            songs = await self.get_all_artist_songs(artist_id, results_limit=limit, initial_page=initial_page)
+        # Save the songs to a file, in the same format as GeniusSearch
+        with open(file_path + name.lower().replace(" ", "_") + "_songs.json", "w") as file:
+            json.dump(songs, file, indent=4)
+        return name
+
+    async def search_and_save_artists(self, artist_names, file_path, limit=None, initial_page=1):
+        # Gather every artist concurrently
+        return await asyncio.gather(*[self.search_and_save_artist_ids(artist_name, file_path, limit, initial_page) for artist_name in artist_names])
+
+    async def get_song_lyrics(self, song_id, path=None):
+        # Get the path of the song page from the details if it isn't known yet
+        if path is None:
+            details = await self.get_song_details(song_id)
+            if details is None:
+                return None
+            path = details["path"]
+        # Download and parse the lyrics page
+        page = await self.fetch(f"{self.web_url}{path}", as_json=False)
+        if page is None:
+            return None
+        if self.parse_executor is None:
+            return parse_lyrics_html(page)
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, parse_lyrics_html, page)
+
+    async def get_songs_lyrics(self, song_ids, paths=None, on_song_done=None):
+        # Get the lyrics of every song concurrently, in the order of the ids (None for the failed songs)
+        if paths is None:
+            paths = [None] * len(song_ids)
+        async def get_and_report(song_id, path):
+            # A song still failing after the retries is left for the next run instead of stopping the others
+            try:
+                lyrics = await self.get_song_lyrics(song_id, path)
+            except RuntimeError as error:
+                print(error)
+                lyrics = None
+            # Let the caller save every song as soon as it arrives
+            if on_song_done is not None:
+                on_song_done(song_id, lyrics)
+            return lyrics
+        return await asyncio.gather(*[get_and_report(song_id, path) for song_id, path in zip(song_ids, paths)])
+
+async def gather_artists(artist_names, file_path, limit=None, initial_page=1, **client_settings):
+    # Create a client and gather the song ids of every artist
+    async with AsyncGeniusSearch(**client_settings) as genius:
+        return await genius.search_and_save_artists(artist_names, file_path, limit, initial_page)
+
+async def gather_lyrics(song_ids, paths=None, on_song_done=None, **client_settings):
+    # Create a client and gather the lyrics of every song
+    async with AsyncGeniusSearch(**client_settings) as genius:
+        return await genius.get_songs_lyrics(song_ids, paths, on_song_done)
@@ -1,35 +1,17 @@
 # Imports
 from bs4 import BeautifulSoup
 import pandas as pd
-from nltk.metrics import jaccard_distance
-from nltk.util import ngrams
-import unidecode
+
+# My classes
+from data_gathering_helpers.corpus_store import write_corpus
+from data_gathering_helpers.title_matcher import TitleMatcher
 
 # CONFIG
 beatles_path = 'beatles_data/'
 webpage_path = "beatles_webpage/webpage.html"
 
-# Calculate similarity score between two texts
-def calculate_similarity(text1, text2, n=2):
-    # Normalize texts
-    text1 = normalize_text(text1)
-    text2 = normalize_text(text2)
-    
-    # Create n-grams
-    grams1 = set(ngrams(text1, n))
-    grams2 = set(ngrams(text2, n))
-    
-    # Calculate Jaccard distance and subtract from 1 to get similarity
-    similarity = 1 - jaccard_distance(grams1, grams2)
-    return similarity
-
-# Normalize text function
-def normalize_text(text):
-    text = unidecode.unidecode(text)  # Normalize UTF-8 characters to ASCII
-    text = text.lower()  # Convert to lowercase
-    return text
-
-def process_beatles_data(lyrics_csv_path):
+def process_beatles_data(lyrics_csv_path, corpus_path=None, min_similarity=0.0):
+    # Songs whose best title similarity isn't above min_similarity are left out
     with open(webpage_path, "r") as file:
         webpage = file.read()
     
@@ -49,20 +31,16 @@ def process_beatles_data(lyrics_csv_path):
     df = pd.DataFrame(data)
     df_with_lyrics = pd.read_csv(lyrics_csv_path + "the_beatles_lyrics.csv")
 
+    # Index the titles of the lyrics once, then look up every song of the composer table
+    matcher = TitleMatcher(df_with_lyrics["song_name"].tolist(), min_similarity=min_similarity)
     matched_rows = []
-    for index, song_composer in df.iterrows():
-        best_match = None
-        highest_similarity = 0
-        for index2, song_no_composer in df_with_lyrics.iterrows():
-            similarity = calculate_similarity(song_composer["Song"], song_no_composer["song_name"])
-            if similarity > highest_similarity:
-                highest_similarity = similarity
-                best_match = song_no_composer
-
-        if best_match is not None:
+    for song, composer in zip(df["Song"], df["Composer"]):
+        position, similarity = matcher.match(song)
+        if position is not None:
+            best_match = df_with_lyrics.iloc[position]
             row = {
                 "song_name": best_match["song_name"],
-                "composer": song_composer["Composer"],
+                "composer": composer,
                 "release_date": best_match["release_date"],
                 "album_name": best_match["album_name"],
                 "lyrics": best_match["Lyrics"]
@@ -71,4 +49,7 @@ def process_beatles_data(lyrics_csv_path):
 
     # save the data
     df_matched = pd.DataFrame(matched_rows)
-    df_matched.to_csv(beatles_path + "beatles_data.csv", index=False)
\ No newline at end of file
+    df_matched.to_csv(beatles_path + "beatles_data.csv", index=False)
+    # Also save it to the corpus store if a path is given
+    if corpus_path is not None:
+        write_corpus(df_matched, corpus_path, "The Beatles")
\ No newline at end of file
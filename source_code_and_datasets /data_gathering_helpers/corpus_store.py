@@ -0,0 +1,139 @@
+# imports
+import os
+from ast import literal_eval
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Types of the known corpus columns, the other columns (scores, hashes...) keep their own types
+corpus_schema = {
+    "song_id": pa.int64(),
+    "song_name": pa.string(),
+    "artist_name": pa.string(),
+    "artist_id": pa.int64(),
+    "composer": pa.string(),
+    "release_date": pa.date32(),
+    "release_year": pa.int32(),
+    "release_month": pa.int32(),
+    "release_day": pa.int32(),
+    "album_name": pa.string(),
+    "path": pa.string(),
+    "lyrics": pa.string(),
+}
+
+def parse_release_date_components(value):
+    # Get the year, month and day of a release date, stored as a dict or as its string
+    if isinstance(value, str):
+        try:
+            value = literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None, None, None
+    if not isinstance(value, dict):
+        return None, None, None
+    return value.get("year"), value.get("month"), value.get("day")
+
+def to_corpus_frame(dataframe, artist_name=None):
+    '''
+    This function converts a songs dataframe (lyrics csv, beatles data or sentiment results) to the corpus columns
+    :param dataframe: The songs
+    :type dataframe: pd.DataFrame
+    :param artist_name: The artist of the songs, used when the dataframe has no artist_name column
+    :type artist_name: str
+
+    :return: A new dataframe with the lyrics in "lyrics" and the release date as a real date
+    :rtype: pd.DataFrame
+    '''
+    frame = dataframe.rename(columns={"Lyrics": "lyrics"}).reset_index(drop=True)
+    if "artist_name" not in frame.columns:
+        frame["artist_name"] = artist_name
+    elif artist_name is not None:
+        frame["artist_name"] = frame["artist_name"].fillna(artist_name)
+    # Parse the release dates once here, so the readers get real dates
+    if "release_date" in frame.columns and not pd.api.types.is_datetime64_any_dtype(frame["release_date"]):
+        components = pd.DataFrame(frame["release_date"].map(parse_release_date_components).tolist(), columns=["year", "month", "day"], index=frame.index)
+        components = components.apply(pd.to_numeric, errors="coerce")
+        for part in ["year", "month", "day"]:
+            frame["release_" + part] = components[part].astype("Int32")
+        # Only the complete dates become a release_date, like refined_literal_date_parse
+        frame["release_date"] = pd.to_datetime(components, errors="coerce")
+    return frame
+
+def to_corpus_table(frame):
+    # Convert the dataframe to an arrow table with the corpus types
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for name, column_type in corpus_schema.items():
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, table.column(name).cast(column_type))
+    # The pandas metadata still has the old types, reading it back would undo the casts
+    return table.replace_schema_metadata(None)
+
+def write_corpus(dataframe, store_path, artist_name=None):
+    '''
+    This function writes songs to the corpus store, replacing the songs of the same artists
+    :param dataframe: The songs
+    :type dataframe: pd.DataFrame
+    :param store_path: The folder of the corpus store
+    :type store_path: str
+    :param artist_name: The artist of the songs, used when the dataframe has no artist_name column
+    :type artist_name: str
+    '''
+    frame = to_corpus_frame(dataframe, artist_name)
+    # One folder per artist, so reading an artist only opens its own files
+    pq.write_to_dataset(
+        to_corpus_table(frame),
+        store_path,
+        partition_cols=["artist_name"],
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+
+def read_corpus(store_path, columns=None, artists=None, start_date=None, end_date=None):
+    '''
+    This function reads songs from the corpus store, only decoding the requested columns and rows
+    :param store_path: The folder of the corpus store
+    :type store_path: str
+    :param columns: The columns to read, None reads every column
+    :type columns: list
+    :param artists: Only read the songs of these artists, None reads every artist
+    :type artists: list
+    :param start_date: Only read the songs released on or after this date
+    :type start_date: str
+    :param end_date: Only read the songs released on or before this date
+    :type end_date: str
+
+    :return: The songs
+    :rtype: pd.DataFrame
+    '''
+    dataset = ds.dataset(store_path, format="parquet", partitioning="hive")
+    # The schema is taken from the first file, but the artists can have different columns (scores of only some artists)
+    # The pandas metadata of the files is dropped, so the corpus types are kept
+    schema = pa.unify_schemas([dataset.schema] + [fragment.physical_schema for fragment in dataset.get_fragments()]).remove_metadata()
+    dataset = ds.dataset(store_path, schema=schema, format="parquet", partitioning="hive")
+    # Filters are applied while reading, skipping the artist folders and row groups that don't match
+    condition = None
+    def add_condition(condition, new_condition):
+        return new_condition if condition is None else condition & new_condition
+    if artists is not None:
+        condition = add_condition(condition, ds.field("artist_name").isin(artists))
+    if start_date is not None:
+        condition = add_condition(condition, ds.field("release_date") >= pa.scalar(pd.Timestamp(start_date).date(), pa.date32()))
+    if end_date is not None:
+        condition = add_condition(condition, ds.field("release_date") <= pa.scalar(pd.Timestamp(end_date).date(), pa.date32()))
+    table = dataset.to_table(columns=columns, filter=condition)
+    dataframe = table.to_pandas(date_as_object=False)
+    # Integer columns with missing values are read as floats, make them nullable integers again
+    for name, column_type in corpus_schema.items():
+        if name in dataframe.columns and pa.types.is_integer(column_type) and dataframe[name].dtype.kind == "f":
+            dataframe[name] = dataframe[name].astype("Int32" if column_type == pa.int32() else "Int64")
+    # The artist folders are read back as categories
+    if "artist_name" in dataframe.columns:
+        dataframe["artist_name"] = dataframe["artist_name"].astype(str)
+    return dataframe
+
+def load_dataset(path, columns=None):
+    # Read a csv file or a corpus store folder, so every script accepts both
+    if os.path.isdir(path):
+        return read_corpus(path, columns)
+    return pd.read_csv(path, usecols=columns)
@@ -0,0 +1,80 @@
+# Imports
+import re
+import unidecode
+
+# My classes
+from data_gathering_helpers.title_matcher import TitleMatcher
+
+# Version descriptors: "(Live / 1990)", "[Band on the Run]", "{...}" and " - live at ..."
+descriptor_pattern = r'\(.*?\)|\[.*?\]|{.*?}| - .*'
+
+def get_song_keys(song_names):
+    '''
+    This function normalizes every song name at once, removing the version descriptors and the punctuation
+    :param song_names: The song names
+    :type song_names: pd.Series
+
+    :return: The normalized names, versions of the same song get the same key
+    :rtype: pd.Series
+    '''
+    keys = song_names.fillna("").map(unidecode.unidecode).str.lower()
+    keys = keys.str.replace(descriptor_pattern, '', regex=True)
+    # "Back In The U.S.S.R." and "Back in the USSR" only differ by punctuation
+    keys = keys.str.replace(r"[^a-z0-9 ]", "", regex=True)
+    keys = keys.str.replace(r"\s+", " ", regex=True).str.strip()
+    # Names made only of a descriptor keep their full name as key
+    return keys.where(keys != "", song_names.fillna("").str.lower())
+
+def get_key_numbers(key):
+    # Numbers and roman numerals of a key: "movement ii" and "movement iii" are different songs
+    return [word for word in key.split() if re.fullmatch(r"\d+|[ivxlc]+", word)]
+
+def find_root(parents, position):
+    # Find the cluster of a position, shortening the path on the way
+    while parents[position] != position:
+        parents[position] = parents[parents[position]]
+        position = parents[position]
+    return position
+
+def cluster_songs(catalog, min_similarity=0.9, across_artists=False):
+    '''
+    This function groups the versions of the same song (live, remaster, demo, spelling) of the whole catalog
+    :param catalog: The songs, with song_id, song_name and artist_name columns
+    :type catalog: pd.DataFrame
+    :param min_similarity: Keys with at least this n-gram similarity are the same song (None only groups equal keys)
+    :type min_similarity: float
+    :param across_artists: Whether the songs of different artists can be grouped together
+    :type across_artists: bool
+
+    :return: The catalog with the song "key", its "cluster" number and the "canonical_id" of the song kept for the cluster
+    :rtype: pd.DataFrame
+    '''
+    catalog = catalog.reset_index(drop=True).copy()
+    catalog["key"] = get_song_keys(catalog["song_name"])
+    group_columns = ["key"] if across_artists else ["artist_name", "key"]
+    # Songs with the same key are the same song
+    catalog["cluster"] = catalog.groupby(group_columns, sort=False).ngroup()
+    if min_similarity is not None:
+        # Merge the clusters whose keys are nearly the same, only comparing the keys that share n-grams
+        keys = catalog.drop_duplicates("cluster").sort_values("cluster")
+        parents = list(range(len(keys)))
+        groups = [keys] if across_artists else [group for _, group in keys.groupby("artist_name", sort=False)]
+        for group in groups:
+            clusters = group["cluster"].tolist()
+            numbers = [get_key_numbers(key) for key in group["key"]]
+            matcher = TitleMatcher(group["key"].tolist())
+            for first, second in matcher.find_similar_pairs(min_similarity):
+                if numbers[first] != numbers[second]:
+                    continue
+                root_first, root_second = find_root(parents, clusters[first]), find_root(parents, clusters[second])
+                if root_first != root_second:
+                    parents[max(root_first, root_second)] = min(root_first, root_second)
+        catalog["cluster"] = [find_root(parents, cluster) for cluster in catalog["cluster"]]
+    # Keep the plainest version of every song: a name without descriptors, then the shortest name, then the first one
+    names = catalog["song_name"].fillna("").str.strip()
+    order = catalog.assign(
+        has_descriptor=names.str.replace(descriptor_pattern, '', regex=True).str.strip() != names,
+        name_length=names.str.len(),
+    ).sort_values(["has_descriptor", "name_length"], kind="stable")
+    catalog["canonical_id"] = catalog["cluster"].map(order.groupby("cluster")["song_id"].first())
+    return catalog
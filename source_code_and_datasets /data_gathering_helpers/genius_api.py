@@ -2,12 +2,16 @@
 import requests
 import json
 import time
-from bs4 import BeautifulSoup
-import re
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# My classes
+from data_gathering_helpers.response_cache import ResponseCache, cached_get
+from data_gathering_helpers.lyrics_parser import parse_lyrics_html
 
 class GeniusSearch:
-    def __init__(self, token=None):
+    def __init__(self, token=None, cache_path=None, cache_ttl=7 * 24 * 3600, cache_max_bytes=2 * 1024 ** 3, offline=False, max_retries=5):
         # If the token is None, get it from the config file
         if token is None:
             self.token = self.get_token()
@@ -17,6 +21,43 @@ class GeniusSearch:
         self.headers = {
             "Authorization": "Bearer " + self.token
         }
+        # Details of every song already fetched from /songs/{id}
+        self.song_details = {}
+        # Open the on-disk response cache if a path is given (offline only answers from it)
+        self.cache = None
+        if cache_path is not None:
+            self.cache = ResponseCache(cache_path, ttl=cache_ttl, max_bytes=cache_max_bytes, offline=offline)
+        # Requests answered with 429 are retried, and no thread sends a request before blocked_until
+        self.max_retries = max_retries
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None):
+        # Send a GET request through the response cache
+        return cached_get(self.cache, url, headers, self.send_request)
+
+    def send_request(self, url, headers=None):
+        '''
+        This function sends a GET request, waiting and retrying when the server answers too many requests
+        :param url: The url of the request
+        :type url: str
+        :param headers: The headers of the request
+        :type headers: dict
+
+        :return: The response, the last 429 or 503 response if every retry was refused
+        :rtype: requests.Response
+        '''
+        for attempt in range(self.max_retries):
+            # Wait out the pause asked by the server, the prefetching threads share it
+            wait = self.blocked_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            response = requests.get(url, headers=headers)
+            if response.status_code not in [429, 503]:
+                return response
+            with self.lock:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + get_retry_wait(response.headers.get("Retry-After"), attempt))
+        return response
 
     def get_token(self):
         # Open the config file and read the token
@@ -37,36 +78,16 @@ class GeniusSearch:
         '''
         # Create the request
         url = "https://api.genius.com/search?q=" + artist_name
-        response = requests.get(url, headers=self.headers)
-        # Artist id list
-        artist_ids = []
-        # Artists names
-        artits_names = []
-        # Iterate through the response and add the id and names to the list
-        for hit in response.json()["response"]["hits"]:
-            artist_ids.append(hit["result"]["primary_artist"]["id"])
-            artits_names.append(hit["result"]["primary_artist"]["name"])
-        # Find the artist id which is most common in the list
-        # check if the name of the id corresponds to the artist name
-        artist_id = None
-        for i in range(len(artist_ids)):
-            if artits_names[i].lower() == artist_name.lower():
-                artist_id = artist_ids[i]
-                break
-        # If it is not found, return the most common id
-        if artist_id is None:
-            artist_id = max(set(artist_ids), key=artist_ids.count)
-        # Get the artist name corresponding to the id
-        artist_name = artits_names[artist_ids.index(artist_id)]
-        # Return the artist id
-        return artist_id, artist_name
+        response = self.get(url, headers=self.headers)
+        # Pick the artist from the search hits
+        return pick_artist_id(response.json()["response"]["hits"], artist_name)
 
     def search_keyword(self, keyword, limit=None):
         # replace the spaces with %20
         keyword = keyword.replace(" ", "%20")
         # Create the request
         url = "https://api.genius.com/search?q=" + keyword
-        response = requests.get(url, headers=self.headers)
+        response = self.get(url, headers=self.headers)
         # If the limit is None, return the response
         if limit is None:
             return response.json()
@@ -74,11 +95,13 @@ class GeniusSearch:
             # If the limit is not None, return the response with the limit
             return response.json()["response"]["hits"][:limit]
 
-    def extract_song_ids(self, response, artist_id, dictionary = {}):
+    def extract_song_ids(self, response, artist_id, dictionary = {}, results_limit=None):
         '''
         This function extracts the song ids from the response
         :param response: The response from the Genius API
         :type response: dict
+        :param results_limit: Stop adding songs once the dictionary has this many
+        :type results_limit: int
 
         :return: A dictionary where keys are the song ids and value is a dict
         with song names, artist name, song title, release date components
@@ -89,46 +112,68 @@ class GeniusSearch:
             new_artist_id = song["primary_artist"]["id"]
             if new_artist_id != artist_id:
                 continue
+            # Stop before fetching the details of songs past the limit
+            if results_limit is not None and len(dictionary) >= results_limit:
+                break
             song_id = song["id"]
+            # One details request per song gives the album, the page path and the release date
+            details = self.get_song_details(song_id)
+            # A failed request must not be saved as a song without an album
+            if details is None:
+                raise RuntimeError(f"The details of song {song_id} could not be fetched")
             dictionary[song_id] = {
                 "song_name": song["title"],
                 "artist_name": song["primary_artist"]["name"],
                 "artist_id": new_artist_id,
-                "release_date": song["release_date_components"],
+                "release_date": song.get("release_date_components") or details.get("release_date_components"),
+                "album_name": get_album_name_from_details(details),
+                "path": song.get("path") or details.get("path"),
             }
-            try:
-                dictionary[song_id]["album_name"] = self.get_album_name(song_id)
-            except:
-                dictionary[song_id]["album_name"] = None
         # Return the dictionary
         return dictionary
 
-    def get_album_name(self, song_id):
-        # Sleep for a random amount of time between 1 and 2 seconds
-        random_time = random.uniform(1, 2)
-        time.sleep(random_time)
+    def get_song_details(self, song_id):
+        '''
+        This function gets the details of a song from the Genius API, fetching every song only once
+        :param song_id: The Genius id of the song
+        :type song_id: int
+
+        :return: The song object of the response, None if the request failed
+        :rtype: dict
+        '''
+        # Return the details if the song was already fetched
+        if song_id in self.song_details:
+            return self.song_details[song_id]
         # Create the request
         url = f"https://api.genius.com/songs/{song_id}"
-        response = requests.get(url, headers=self.headers)
-        # If the response status code is 200, return the album name
-        if response.status_code == 200:
-            try:
-                album_name = response.json()["response"]["song"]["album"]["name"]
-                return album_name
-            except:
-                return None
-        else:
-            # If the response status code is not 200, return None
+        response = self.get(url, headers=self.headers)
+        # If the response status code is not 200, return None (and try again next time)
+        if response.status_code != 200:
             return None
+        details = response.json()["response"]["song"]
+        self.song_details[song_id] = details
+        return details
+
+    def get_album_name(self, song_id):
+        # Get the album name from the song details
+        return get_album_name_from_details(self.get_song_details(song_id))
+
+    def get_artist_songs_page(self, artist_id, results_per_page, page):
+        # Request one page of the songs of the artist
+        url = f"https://api.genius.com/artists/{artist_id}/songs?per_page={results_per_page}&page={page}"
+        return self.get(url, headers=self.headers)
 
-    def get_all_artist_songs(self, artist_id, results_per_page=50, results_limit=None, initial_page = 1, pbar=None):
+    def get_all_artist_songs(self, artist_id, results_per_page=50, results_limit=None, initial_page = 1, pbar=None, prefetch_pages=None):
+        # Fetch the pages ahead in parallel if a window is given
+        if prefetch_pages is not None:
+            return self.get_all_artist_songs_parallel(artist_id, results_per_page, results_limit, initial_page, pbar, prefetch_pages)
         # Create empty dictionary
         dictionary = {}
         # Starting page
         page = initial_page
         # Create the request
         blank_url = f"https://api.genius.com/artists/{artist_id}/songs?per_page={results_per_page}&page={page}"
-        response = requests.get(blank_url, headers=self.headers)
+        response = self.get(blank_url, headers=self.headers)
         while True:
             if pbar is not None:
                 # Set one of the progress bar's descriptions to the page number
@@ -136,11 +181,9 @@ class GeniusSearch:
                 pbar.set_postfix({"Page": page})
             # If the response status code is 200, extract the song ids
             if response.status_code == 200:
-                dictionary = self.extract_song_ids(response.json(), artist_id, dictionary)
-                # If the limit is not None and the dictionary length is greater than the limit, break
+                dictionary = self.extract_song_ids(response.json(), artist_id, dictionary, results_limit)
+                # If the limit is not None and the dictionary reached the limit, break
                 if results_limit is not None and len(dictionary) >= results_limit:
-                    # Remove the extra songs
-                    dictionary = {k: v for k, v in dictionary.items() if k in list(dictionary.keys())[:results_limit]}
                     print(f"Page {page} finished processing and truncated final results.")
                     break
                 # If the response is empty, break
@@ -151,7 +194,7 @@ class GeniusSearch:
                 page += 1
                 # Create the request
                 url = f"https://api.genius.com/artists/{artist_id}/songs?per_page={results_per_page}&page={page}"
-                response = requests.get(url, headers=self.headers)
+                response = self.get(url, headers=self.headers)
                 # Sleep for a random amount of time between 1 and 2 seconds
                 random_time = random.uniform(1, 2)
                 time.sleep(random_time)
@@ -166,48 +209,135 @@ class GeniusSearch:
         # Return the dictionary
         return dictionary
 
-    def search_and_save_artist_ids(self, artist_name, file_path, limit=None, initial_page = 1, pbar=None):
+    def get_all_artist_songs_parallel(self, artist_id, results_per_page=50, results_limit=None, initial_page=1, pbar=None, prefetch_pages=4):
+        '''
+        This function gets the songs of an artist, downloading the next pages while the current one is processed
+        :param artist_id: The Genius id of the artist
+        :type artist_id: int
+        :param prefetch_pages: The number of pages downloaded ahead of the current one
+        :type prefetch_pages: int
+
+        :return: A dictionary where keys are the song ids and value is a dict
+        with song names, artist name, song title, release date components
+        :rtype: dict
+        '''
+        dictionary = {}
+        page = initial_page
+        with ThreadPoolExecutor(max_workers=prefetch_pages) as executor:
+            # Start the first window of pages
+            pending = {}
+            next_page = initial_page
+            for _ in range(prefetch_pages):
+                pending[next_page] = executor.submit(self.get_artist_songs_page, artist_id, results_per_page, next_page)
+                next_page += 1
+            # Process the pages in order as they arrive
+            while True:
+                response = pending.pop(page).result()
+                if pbar is not None:
+                    pbar.set_postfix({"Page": page})
+                # If the response status code is not 200, break
+                if response.status_code != 200:
+                    break
+                # If the response is empty, break
+                if len(response.json()["response"]["songs"]) == 0:
+                    print(f"Page {page} contained no results.")
+                    break
+                # Keep the window full while this page is processed
+                pending[next_page] = executor.submit(self.get_artist_songs_page, artist_id, results_per_page, next_page)
+                next_page += 1
+                dictionary = self.extract_song_ids(response.json(), artist_id, dictionary, results_limit)
+                # If the limit is not None and the dictionary reached the limit, break
+                if results_limit is not None and len(dictionary) >= results_limit:
+                    print(f"Page {page} finished processing and truncated final results.")
+                    break
+                page += 1
+                if pbar is not None:
+                    pbar.set_postfix({"Songs Found": len(dictionary)})
+            # Don't start the pages past the end that are still waiting
+            for future in pending.values():
+                future.cancel()
+        # Return the dictionary
+        return dictionary
+
+    def search_and_save_artist_ids(self, artist_name, file_path, limit=None, initial_page = 1, pbar=None, prefetch_pages=None):
         # Get the artist id
         artist_id, name = self.get_artist_id(artist_name)
         # Get the artist songs
-        songs = self.get_all_artist_songs(artist_id, results_limit=limit, initial_page=initial_page, pbar=pbar)
+        songs = self.get_all_artist_songs(artist_id, results_limit=limit, initial_page=initial_page, pbar=pbar, prefetch_pages=prefetch_pages)
         # Save the songs to a file
         with open(file_path + name.lower().replace(" ", "_") + "_songs.json", "w") as file:
             json.dump(songs, file, indent=4)
 
-    def get_song_lyrics(self, song_id):
+    def get_song_lyrics(self, song_id, path=None):
+        # Get the path of the song page from the details if it isn't known yet
+        if path is None:
+            details = self.get_song_details(song_id)
+            if details is None:
+                # If the details request failed, return None
+                return None
+            path = details["path"]
         # Create the request
-        url = f"https://api.genius.com/songs/{song_id}"
-        response = requests.get(url, headers=self.headers)
+        url = f"https://genius.com{path}"
+        page = self.get(url)
         # If the response status code is 200, return the lyrics
-        if response.status_code == 200:
-            path = response.json()["response"]["song"]["path"]
-            # Create the request
-            url = f"https://genius.com{path}"
-            page = requests.get(url)
-            # If the response status code is 200, return the lyrics
-            if response.status_code == 200:
-                html = BeautifulSoup(page.text, "html.parser")
-                divs = html.find_all("div", class_=re.compile("^lyrics$|Lyrics__Container"))
-                    # This function ensures spaces are correctly inserted between elements
-                def add_space(element):
-                    text = ' '.join(element.stripped_strings)
-                    return text.replace(' ]', ']').replace('[ ', '[')  # Clean up bracket spacing
-
-                lyrics = "\n".join([add_space(div) for div in divs])
-                lyrics = re.sub(r'(\[.*?\])*', '', lyrics)
-                lyrics = re.sub('\n{2}', '\n', lyrics)  # Reduce gaps between verses
-                return lyrics.strip("\n")
-            else: 
-                # If the response status code is not 200, return None
-                return None
-        else:
+        if page.status_code == 200:
+            return parse_lyrics_html(page.text)
+        else: 
             # If the response status code is not 200, return None
             return None
 
-def get_lyrics(id, genius_object):
+def get_retry_wait(retry_after, attempt):
+    # Seconds to wait before retrying, from the Retry-After header or doubling with every attempt
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return 2 ** attempt
+
+def get_album_name_from_details(details):
+    # Get the album name from the song details, None if the song has no album
+    try:
+        return details["album"]["name"]
+    except (TypeError, KeyError):
+        return None
+
+def pick_artist_id(hits, artist_name):
+    '''
+    This function picks the artist id from the hits of a search
+    :param hits: The hits of the Genius search response
+    :type hits: list
+    :param artist_name: The name of the artist
+    :type artist_name: str
+
+    :return: The artist id, the artist name
+    :rtype: int
+    :rtype: str
+    '''
+    # Artist id list
+    artist_ids = []
+    # Artists names
+    artits_names = []
+    # Iterate through the response and add the id and names to the list
+    for hit in hits:
+        artist_ids.append(hit["result"]["primary_artist"]["id"])
+        artits_names.append(hit["result"]["primary_artist"]["name"])
+    # Find the artist id which is most common in the list
+    # check if the name of the id corresponds to the artist name
+    artist_id = None
+    for i in range(len(artist_ids)):
+        if artits_names[i].lower() == artist_name.lower():
+            artist_id = artist_ids[i]
+            break
+    # If it is not found, return the most common id
+    if artist_id is None:
+        artist_id = max(set(artist_ids), key=artist_ids.count)
+    # Get the artist name corresponding to the id
+    artist_name = artits_names[artist_ids.index(artist_id)]
+    # Return the artist id
+    return artist_id, artist_name
+
+def get_lyrics(id, genius_object, path=None):
     # get the lyrics
-    lyrics = genius_object.get_song_lyrics(id)
+    lyrics = genius_object.get_song_lyrics(id, path)
     # return the lyrics
     return lyrics
 
@@ -0,0 +1,38 @@
+# imports
+import os
+import json
+
+class LyricsCheckpoint:
+    def __init__(self, path):
+        # Load the lyrics saved by a previous (interrupted) run
+        self.path = path
+        self.lyrics = {}
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be cut short by a crash
+                        continue
+                    self.lyrics[str(entry["song_id"])] = entry["lyrics"]
+        # Create the folder and open the file to append the new songs
+        folder = os.path.dirname(path)
+        if folder != "":
+            os.makedirs(folder, exist_ok=True)
+        self.file = open(path, "a")
+
+    def save(self, song_id, lyrics):
+        # Append the lyrics of one song and make sure they reach the disk
+        self.file.write(json.dumps({"song_id": str(song_id), "lyrics": lyrics}) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.lyrics[str(song_id)] = lyrics
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        # Delete the checkpoint once the lyrics csv is written
+        self.close()
+        os.remove(self.path)
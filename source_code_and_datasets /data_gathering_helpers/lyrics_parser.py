@@ -0,0 +1,71 @@
+# imports
+import re
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml is much faster than the builtin parser, use it when it is installed
+try:
+    import lxml
+    default_parser = "lxml"
+except ImportError:
+    default_parser = "html.parser"
+
+# Class of the divs holding the lyrics on a genius.com song page
+lyrics_class = re.compile("^lyrics$|Lyrics__Container")
+
+def parse_lyrics_html(page_html, parser=None):
+    '''
+    This function extracts the lyrics from a genius.com song page
+    :param page_html: The html of the song page
+    :type page_html: str
+    :param parser: The BeautifulSoup parser, None uses lxml if it is installed
+    :type parser: str
+
+    :return: The lyrics of the song
+    :rtype: str
+    '''
+    if parser is None:
+        parser = default_parser
+    # Only build the tree of the lyrics containers, the rest of the page is skipped
+    html = BeautifulSoup(page_html, parser, parse_only=SoupStrainer("div", class_=lyrics_class))
+    divs = html.find_all("div", class_=lyrics_class)
+    # This function ensures spaces are correctly inserted between elements
+    def add_space(element):
+        text = ' '.join(element.stripped_strings)
+        return text.replace(' ]', ']').replace('[ ', '[')  # Clean up bracket spacing
+
+    lyrics = "\n".join([add_space(div) for div in divs])
+    lyrics = re.sub(r'(\[.*?\])*', '', lyrics)
+    lyrics = re.sub('\n{2}', '\n', lyrics)  # Reduce gaps between verses
+    return lyrics.strip("\n")
+
+def create_parse_executor(workers, use_processes=True):
+    # Pool parsing the pages apart from the network requests,
+    # processes avoid the GIL but threads are cheaper to start
+    if use_processes:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+def parse_lyrics_pages(pages, workers=None, use_processes=True, parser=None):
+    '''
+    This function extracts the lyrics of many song pages, in a pool if workers is given
+    :param pages: The html of every song page, None for failed downloads
+    :type pages: list
+    :param workers: The number of parsing workers, None parses in this process
+    :type workers: int
+
+    :return: The lyrics of every page in the same order, None for the missing pages
+    :rtype: list
+    '''
+    def parse(page):
+        return None if page is None else parse_lyrics_html(page, parser)
+    if workers is None:
+        return [parse(page) for page in pages]
+    with create_parse_executor(workers, use_processes) as executor:
+        # Only the pages that exist are sent to the workers
+        indexes = [i for i, page in enumerate(pages) if page is not None]
+        parsed = executor.map(parse_lyrics_html, [pages[i] for i in indexes], [parser] * len(indexes), chunksize=8 if use_processes else 1)
+        lyrics = [None] * len(pages)
+        for i, text in zip(indexes, parsed):
+            lyrics[i] = text
+        return lyrics
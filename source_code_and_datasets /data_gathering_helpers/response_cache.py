@@ -0,0 +1,190 @@
+# imports
+import sqlite3
+import json
+import time
+import threading
+
+class CachedResponse:
+    def __init__(self, status_code, text, headers=None):
+        # Same attributes as the requests responses used by GeniusSearch
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers if headers is not None else {}
+
+    def json(self):
+        return json.loads(self.text)
+
+class NotCachedError(RuntimeError):
+    # An offline cache was asked for a response it doesn't have
+    pass
+
+class ResponseCache:
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=2 * 1024 ** 3, offline=False):
+        # Save the configuration, a ttl of None keeps the responses fresh forever
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        # Open the database and create the table if it doesn't exist yet,
+        # the connection is shared by the threads fetching pages, one at a time
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, "
+            "body TEXT, "
+            "etag TEXT, "
+            "last_modified TEXT, "
+            "fetched_at REAL, "
+            "last_used REAL, "
+            "size INTEGER)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.connection.commit()
+
+    def get(self, url):
+        '''
+        This function looks up the cached response of a url
+        :param url: The url of the request
+        :type url: str
+
+        :return: A dict with the body, etag, last_modified and fetched_at, None if it isn't cached
+        :rtype: dict
+        '''
+        with self.lock:
+            row = self.connection.execute("SELECT body, etag, last_modified, fetched_at FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            # Mark the response as recently used so it is evicted last
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            self.connection.commit()
+            return {"body": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def is_fresh(self, entry):
+        # A response is fresh until its ttl runs out
+        return self.ttl is None or time.time() - entry["fetched_at"] < self.ttl
+
+    def get_revalidation_headers(self, entry):
+        # Headers asking the server to answer 304 if the response hasn't changed
+        headers = {}
+        if entry["etag"] is not None:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"] is not None:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def lookup(self, url, headers=None):
+        '''
+        This function answers a request from the cache when possible, or prepares the request to send
+        :param url: The url of the request
+        :type url: str
+        :param headers: The headers of the request
+        :type headers: dict
+
+        :return: The cached body (None if the request has to be sent), the cache entry and the headers to send
+        :rtype: str
+        :rtype: dict
+        :rtype: dict
+        '''
+        entry = self.get(url)
+        # Fresh responses (or any cached response when offline) don't touch the network
+        if entry is not None and (self.offline or self.is_fresh(entry)):
+            return entry["body"], entry, headers
+        if self.offline:
+            raise NotCachedError(f"{url} is not in the response cache (offline)")
+        # Ask the server whether the stale response is still valid
+        request_headers = dict(headers) if headers is not None else {}
+        if entry is not None:
+            request_headers.update(self.get_revalidation_headers(entry))
+        return None, entry, request_headers
+
+    def update(self, url, entry, status_code, body=None, response_headers=None):
+        '''
+        This function updates the cache with the answer of the server
+        :param url: The url of the request
+        :type url: str
+        :param entry: The cache entry returned by lookup
+        :type entry: dict
+        :param status_code: The status code of the response
+        :type status_code: int
+        :param body: The body of the response, only needed for a 200
+        :type body: str
+
+        :return: The body to answer with, None if the response isn't a 200 or a 304 of a cached response
+        :rtype: str
+        '''
+        # The stale cached response is still valid
+        if status_code == 304 and entry is not None:
+            self.refresh(url)
+            return entry["body"]
+        if status_code == 200:
+            response_headers = response_headers if response_headers is not None else {}
+            self.put(url, body, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+            return body
+        return None
+
+    def put(self, url, body, etag=None, last_modified=None):
+        with self.lock:
+            # Store a response and keep the cache under its size limit
+            now = time.time()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, now, now, len(body.encode("utf-8")))
+            )
+            self.connection.commit()
+            self.evict()
+
+    def refresh(self, url):
+        with self.lock:
+            # The server confirmed the response is unchanged (304), restart its ttl
+            now = time.time()
+            self.connection.execute("UPDATE responses SET fetched_at = ?, last_used = ? WHERE url = ?", (now, now, url))
+            self.connection.commit()
+
+    def evict(self):
+        with self.lock:
+            # Remove the least recently used responses until the cache fits in max_bytes
+            if self.max_bytes is None:
+                return
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.connection.execute("SELECT url, size FROM responses ORDER BY last_used ASC").fetchall()
+            to_delete = []
+            for url, size in rows:
+                if total <= self.max_bytes:
+                    break
+                to_delete.append((url,))
+                total -= size
+            self.connection.executemany("DELETE FROM responses WHERE url = ?", to_delete)
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def cached_get(cache, url, headers, send_request):
+    '''
+    This function answers a GET request from the cache, revalidating or downloading it when needed
+    :param cache: The response cache, None sends every request
+    :type cache: ResponseCache
+    :param url: The url of the request
+    :type url: str
+    :param headers: The headers of the request
+    :type headers: dict
+    :param send_request: Function sending the request with the given url and headers
+    :type send_request: function
+
+    :return: The response, with status_code, text, headers and json()
+    :rtype: requests.Response
+    '''
+    if cache is None:
+        return send_request(url, headers)
+    body, entry, request_headers = cache.lookup(url, headers)
+    if body is not None:
+        return CachedResponse(200, body)
+    response = send_request(url, request_headers)
+    # A 304 is answered with the cached body
+    if response.status_code == 304 and entry is not None:
+        return CachedResponse(200, cache.update(url, entry, 304))
+    cache.update(url, entry, response.status_code, response.text, response.headers)
+    return response
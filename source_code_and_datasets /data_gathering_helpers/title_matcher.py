@@ -0,0 +1,94 @@
+# Imports
+from collections import defaultdict
+from nltk.util import ngrams
+import unidecode
+
+# Normalize text function
+def normalize_text(text):
+    text = unidecode.unidecode(text)  # Normalize UTF-8 characters to ASCII
+    text = text.lower()  # Convert to lowercase
+    return text
+
+class TitleMatcher:
+    def __init__(self, titles, n=2, min_similarity=0.0):
+        '''
+        This class finds the most similar title of a list, by the Jaccard similarity of their character n-grams
+        :param titles: The titles to match against
+        :type titles: list
+        :param n: The size of the character n-grams
+        :type n: int
+        :param min_similarity: Matches must score above this similarity
+        :type min_similarity: float
+        '''
+        self.n = n
+        self.min_similarity = min_similarity
+        # Normalize and n-gram every title only once
+        self.grams = [self.get_grams(title) for title in titles]
+        # Inverted index from every n-gram to the titles containing it
+        self.index = defaultdict(list)
+        for position, grams in enumerate(self.grams):
+            for gram in grams:
+                self.index[gram].append(position)
+
+    def get_grams(self, title):
+        # Missing titles have no n-grams and never match
+        if not isinstance(title, str):
+            return set()
+        return set(ngrams(normalize_text(title), self.n))
+
+    def match(self, title):
+        '''
+        This function finds the most similar title, the first one wins ties
+        :param title: The title to look for
+        :type title: str
+
+        :return: The position of the best title (None if nothing scores above min_similarity) and its similarity
+        :rtype: tuple
+        '''
+        grams = self.get_grams(title)
+        # Only the titles sharing an n-gram can have a similarity above 0,
+        # count how many n-grams each of them shares
+        shared = defaultdict(int)
+        for gram in grams:
+            for position in self.index.get(gram, []):
+                shared[position] += 1
+        best_position = None
+        highest_similarity = self.min_similarity
+        for position in sorted(shared):
+            intersection = shared[position]
+            union = len(grams) + len(self.grams[position]) - intersection
+            # Same computation as 1 - nltk's jaccard_distance
+            similarity = 1 - (union - intersection) / union
+            if similarity > highest_similarity:
+                highest_similarity = similarity
+                best_position = position
+        if best_position is None:
+            return None, 0.0
+        return best_position, highest_similarity
+
+    def match_all(self, titles):
+        # Match every title of a list
+        return [self.match(title) for title in titles]
+
+    def find_similar_pairs(self, min_similarity):
+        '''
+        This function finds every pair of the indexed titles with at least the given similarity
+        :param min_similarity: The smallest similarity of a pair
+        :type min_similarity: float
+
+        :return: The pairs of positions (first, second) with first < second
+        :rtype: list
+        '''
+        pairs = []
+        for position, grams in enumerate(self.grams):
+            # Count the n-grams shared with the titles after this one
+            shared = defaultdict(int)
+            for gram in grams:
+                for other in self.index[gram]:
+                    if other > position:
+                        shared[other] += 1
+            for other, intersection in shared.items():
+                union = len(grams) + len(self.grams[other]) - intersection
+                if 1 - (union - intersection) / union >= min_similarity:
+                    pairs.append((position, other))
+        return pairs
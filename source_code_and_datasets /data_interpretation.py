@@ -3,34 +3,67 @@
 
 # Imports
 import os
-import pandas as pd
+import sys
+import time
+import hashlib
+import importlib
 from datetime import datetime
 from ast import literal_eval
 
-from collections import Counter
-import nltk
-from nltk.tokenize import word_tokenize
-from wordcloud import WordCloud, STOPWORDS
-from nltk.corpus import wordnet
-from nltk import pos_tag
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-import spacy
-
-# Plotting stuffs
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.dates as mdates
-import matplotlib.patches as mpatches
+# Time spent on every import, so the slow ones show up in the startup report
+import_times = {}
+
+def lazy_import(module_name):
+    '''
+    This function imports a module the first time it is needed, recording how long it took
+    :param module_name: The name of the module, like "matplotlib.pyplot"
+    :type module_name: str
+
+    :return: The module
+    :rtype: module
+    '''
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_times[module_name] = time.perf_counter() - start
+    return module
+
+# pandas is used by every report
+pd = lazy_import("pandas")
+
+# My classes, imported after pandas so its import time is recorded
+from data_interpretation_helpers.token_cache import TokenCache
+from data_interpretation_helpers.lexical_index import LexicalIndex
 
 # Significant historical events dictionary
 history = {"Kennedy Assassination": "1963-11-22", "Civil Rights Act": "1964-07-02", "Moon Landing": "1969-07-20", "John Meets Yoko Ono": "1966-11-07", "Paul Meets Linda Eastman": "1968-07-17"}
 beatles_albums_release = {"Please Please Me": "1963-03-22", "With the Beatles": "1963-11-22", "A Hard Day's Night": "1964-07-10", "Beatles for Sale": "1964-12-04", "Help!": "1965-08-06", "Rubber Soul": "1965-12-03", "Revolver": "1966-08-05", "Sgt. Pepper's": "1967-06-01", "Magical Mystery Tour": "1967-11-27", "The Beatles (White Album)": "1968-11-22", "Abbey Road": "1969-09-26"}
 
-nlp = spacy.load("en_core_web_sm")
+# The spaCy model is only loaded by the reports that need it
+nlp = None
+
+def get_nlp():
+    # Load the spaCy model on first use
+    global nlp
+    if nlp is None:
+        spacy = lazy_import("spacy")
+        start = time.perf_counter()
+        # Only the tagger is used: the parser, the entity recognizer and the lemmatizer are skipped
+        nlp = spacy.load("en_core_web_sm", disable=["parser", "ner", "lemmatizer"])
+        import_times['spacy.load("en_core_web_sm")'] = time.perf_counter() - start
+    return nlp
+
+def print_startup_report():
+    # Print the time spent on every import and model load, slowest first
+    print("Startup time:")
+    for name, seconds in sorted(import_times.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name}: {seconds * 1000:.0f} ms")
+    print(f"  Total: {sum(import_times.values()) * 1000:.0f} ms")
 
 # Define a function to convert between NLTK's POS tags and wordnet's POS tags
 def get_wordnet_pos(treebank_tag):
+    wordnet = lazy_import("nltk.corpus").wordnet
     if treebank_tag.startswith('J'):
         return wordnet.ADJ
     elif treebank_tag.startswith('V'):
@@ -42,91 +75,148 @@ def get_wordnet_pos(treebank_tag):
     else:
         return None
 
-# Function to process lyrics: tokenize, remove stopwords, and return words
-def process_lyrics(lyrics, stopwords_set):
-    words = word_tokenize(lyrics.lower())
-    filtered_words = [word for word in words if word.isalpha() and word not in stopwords_set]
-    return filtered_words
+def new_figure(figsize):
+    # Figures are made without pyplot, so no global state is shared between the reports
+    # and they render with the non-interactive Agg canvas
+    return lazy_import("matplotlib.figure").Figure(figsize=figsize)
+
+def save_figure(fig, output_path):
+    # Save the figure and free it straight away, so rendering many reports doesn't grow the memory
+    fig.savefig(output_path)
+    fig.clear()
+    return output_path
+
+def get_output_path(name, output_path=None):
+    # Default filename of a plot, using the time and date as part of the filename
+    if output_path is not None:
+        return output_path
+    now = datetime.now()
+    return f'plots/{name}_{now.strftime("%Y-%m-%d_%H-%M-%S")}.png'
 
-def create_distribution_plot(data):
+def create_distribution_plot(data, composers=['McCartney', 'Lennon'], output_path=None):
+    sns = lazy_import("seaborn")
     # Assuming 'data' is a DataFrame with the same structure as the one we've used
-    # Filter to include only rows with composers McCartney and Lennon
-    filtered_data = data[data['composer'].isin(['McCartney', 'Lennon'])]
-    
-    # Set the aesthetic style of the plots
-    sns.set_theme(style="whitegrid")
+    # Filter to include only rows with the composers
+    filtered_data = data[data['composer'].isin(composers)]
     
-    # Create the violin plot
-    plt.figure(figsize=(10, 6))
-    ax = sns.violinplot(x=filtered_data['composer'], y=filtered_data['Category Score'], inner='quartile')
+    # Create the violin plot with the whitegrid style, only for this figure so the other reports of a worker keep theirs
+    with sns.axes_style("whitegrid"):
+        fig = new_figure((10, 6))
+        ax = fig.add_subplot()
+        sns.violinplot(x=filtered_data['composer'], y=filtered_data['Category Score'], inner='quartile', ax=ax)
     
     # Setting the y-axis limits from -1 to 1
     ax.set_ylim(-1, 1)
     
     # Adding titles and labels
-    plt.title('Lennon vs. McCartney Distribution of Sentiment Scores for Beatles Lyrics', fontsize=16)
-    plt.xlabel('Composer', fontsize=14)
-    plt.ylabel('Sentiment Score', fontsize=14)
+    ax.set_title(f'{" vs. ".join(sorted(composers))} Distribution of Sentiment Scores for Beatles Lyrics', fontsize=16)
+    ax.set_xlabel('Composer', fontsize=14)
+    ax.set_ylabel('Sentiment Score', fontsize=14)
     
-    # Save the plot as an image, using the time and date as part of the filename
-    now = datetime.now()
-    plt.savefig(f'plots/distribution_plot_{now.strftime("%Y-%m-%d_%H-%M-%S")}.png')
-
-def create_unique_word_cloud(data):
-    stopwords_set = set(spacy.lang.en.stop_words.STOP_WORDS) | set(STOPWORDS)
-    
-    # Process lyrics for each composer using SpaCy
-    mccartney_lyrics = ' '.join(data[data['composer'] == 'McCartney']['lyrics'])
-    lennon_lyrics = ' '.join(data[data['composer'] == 'Lennon']['lyrics'])
+    # Save the plot as an image
+    return save_figure(fig, get_output_path("distribution_plot", output_path))
+
+def get_model_name():
+    # Name and version of the spaCy model, read from the installed package without loading the model
+    return f'en_core_web_sm-{lazy_import("spacy.util").get_package_version("en_core_web_sm")}'
+
+def tag_songs(lyrics_list, cache_path=None, batch_size=64, n_process=1):
+    '''
+    This function tags the words of every song with spaCy, one doc per song, skipping the songs already in the cache
+    :param lyrics_list: The lyrics of every song
+    :type lyrics_list: list
+    :param cache_path: The path of the token cache, None tags every song again
+    :type cache_path: str
+    :param batch_size: The number of songs spaCy tags at once
+    :type batch_size: int
+    :param n_process: The number of processes spaCy tags with
+    :type n_process: int
+
+    :return: The (word, POS tag) pairs of the alphabetic words of every song, lowercased
+    :rtype: list
+    '''
+    lyrics_list = [lyrics.lower() if isinstance(lyrics, str) else "" for lyrics in lyrics_list]
+    cache = None
+    tokens_list = [None] * len(lyrics_list)
+    if cache_path is not None:
+        # The model name and version are part of the key, the spaCy model is only loaded on a miss
+        cache = TokenCache(cache_path, get_model_name())
+        tokens_list = cache.get_many(lyrics_list)
+    missing = [i for i, tokens in enumerate(tokens_list) if tokens is None]
+    if len(missing) > 0:
+        # Songs are streamed through the pipeline, so no doc goes over the max length of spaCy
+        docs = get_nlp().pipe([lyrics_list[i] for i in missing], batch_size=batch_size, n_process=n_process)
+        for i, doc in zip(missing, docs):
+            tokens_list[i] = [(token.text, token.pos_) for token in doc if token.is_alpha]
+        if cache is not None:
+            cache.put_many([lyrics_list[i] for i in missing], [tokens_list[i] for i in missing])
+    if cache is not None:
+        cache.close()
+    return tokens_list
+
+# Lexical index of every dataset, built or loaded once per process
+lexical_index_cache = {}
+
+def get_lexical_index(data, index_path="sentiment_scores/lexical_index.npz", cache_path="sentiment_scores/song_token_cache.sqlite", batch_size=64, n_process=1):
+    '''
+    This function gets the token and POS index of the songs, only tagging the songs when the saved index is of another dataset
+    :param data: The dataset, with the lyrics of every song
+    :type data: pd.DataFrame
+    :param index_path: The path of the saved index, None keeps it in memory only
+    :type index_path: str
+    :param cache_path: The path of the token cache used when the index is built
+    :type cache_path: str
+
+    :return: The index, its rows are the rows of the dataset
+    :rtype: LexicalIndex
+    '''
+    songs = data.drop(columns=["lyrics"])
+    # The POS tags change with the spaCy model, so an index of another model version is built again
+    key = hashlib.sha1(get_model_name().encode("utf-8") + pd.util.hash_pandas_object(data[["song_name", "composer", "lyrics"]].astype("string"), index=False).values.tobytes()).hexdigest()
+    if key in lexical_index_cache:
+        return lexical_index_cache[key]
+    index = None
+    if index_path is not None and os.path.exists(index_path):
+        index = LexicalIndex.load(index_path)
+        if index.dataset_key != key:
+            index = None
+    if index is None:
+        # Tag the songs (or read them from the token cache) and build the index
+        song_tokens = tag_songs(data["lyrics"].tolist(), cache_path, batch_size, n_process)
+        index = LexicalIndex.from_tokens(song_tokens, songs, key)
+        if index_path is not None:
+            index.save(index_path)
+    lexical_index_cache[key] = index
+    return index
+
+def create_unique_word_cloud(data, composers=['McCartney', 'Lennon'], output_path=None, index_path="sentiment_scores/lexical_index.npz", cache_path="sentiment_scores/song_token_cache.sqlite", batch_size=64, n_process=1):
+    wordcloud = lazy_import("wordcloud")
+    stopwords_set = set(lazy_import("spacy.lang.en.stop_words").STOP_WORDS) | set(wordcloud.STOPWORDS)
     
-    # Process the lyrics
-    mccartney_words = process_lyrics(mccartney_lyrics, stopwords_set)
-    lennon_words = process_lyrics(lennon_lyrics, stopwords_set)
-
-    # Identify common words
-    common_words = set(mccartney_words) & set(lennon_words)
+    # Count the adjectives of every composer that no other composer uses, from the token index of the songs
+    index = get_lexical_index(data, index_path, cache_path, batch_size, n_process)
+    groups = {composer: index.get_rows("composer", composer) for composer in composers}
+    unique_adjectives = index.get_unique_words(groups, tags=['ADJ'], stopwords=stopwords_set)
 
-    # Remove common words from each set
-    mccartney_unique = [word for word in mccartney_words if word not in common_words]
-    lennon_unique = [word for word in lennon_words if word not in common_words]
+    fig = new_figure((5 * len(composers), 5))
+    for i, composer in enumerate(composers):
+        adjectives_freq = index.to_frequencies(unique_adjectives[composer])
 
-    # Covert them back to strings
-    mccartney_unique = ' '.join(mccartney_unique)
-    lennon_unique = ' '.join(lennon_unique)
-
-    mccartney_doc = nlp(mccartney_unique)
-    lennon_doc = nlp(lennon_unique)
-    
-    # Extract adjectives using SpaCy's POS tagging
-    mccartney_adjectives = [token.text for token in mccartney_doc if token.pos_ == 'ADJ' and token.text not in stopwords_set]
-    lennon_adjectives = [token.text for token in lennon_doc if token.pos_ == 'ADJ' and token.text not in stopwords_set]
-    
-    # Count frequency of adjectives
-    mccartney_adjectives_freq = Counter(mccartney_adjectives)
-    lennon_adjectives_freq = Counter(lennon_adjectives)
-    
-    # Generate and display word clouds
-    mccartney_wordcloud = WordCloud(background_color ='white').generate_from_frequencies(mccartney_adjectives_freq)
-    lennon_wordcloud = WordCloud(background_color ='white').generate_from_frequencies(lennon_adjectives_freq)
-    
-    plt.figure(figsize=(10, 5))
-    
-    plt.subplot(1, 2, 1)
-    plt.imshow(mccartney_wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.title('McCartney Unique Adjectives')
-    
-    plt.subplot(1, 2, 2)
-    plt.imshow(lennon_wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.title('Lennon Unique Adjectives')
+        # Generate and display the word cloud
+        composer_wordcloud = wordcloud.WordCloud(background_color ='white').generate_from_frequencies(adjectives_freq)
+        ax = fig.add_subplot(1, len(composers), i + 1)
+        ax.imshow(composer_wordcloud, interpolation='bilinear')
+        ax.axis('off')
+        ax.set_title(f'{composer} Unique Adjectives')
 
-    # Save the plot as an image, using the time and date as part of the filename
-    now = datetime.now()
-    plt.savefig(f'plots/unique_wordcloud_{now.strftime("%Y-%m-%d_%H-%M-%S")}.png')
+    # Save the plot as an image
+    return save_figure(fig, get_output_path("unique_wordcloud", output_path))
 
 # Refined approach to handle potential None values or other anomalies in the data
 def refined_literal_date_parse(date_str):
+    # Dates read from the corpus store are already parsed
+    if isinstance(date_str, datetime):
+        return date_str
     try:
         date_dict = literal_eval(date_str)
         if all(key in date_dict for key in ['year', 'month', 'day']):
@@ -136,93 +226,132 @@ def refined_literal_date_parse(date_str):
     except:
         return None
 
-# Function to calculate and plot moving average of sentiment scores with specified granularity
-def calculate_and_plot_moving_average(data, months):
-    # Convert release_date to datetime
-    data['release_date'] = data['release_date'].apply(refined_literal_date_parse)
-    data['year_month'] = data['release_date'].dt.to_period('M')
-    
-    # Group by composer and year_month, then calculate the average Category Score
-    grouped_data = data.groupby(['composer', 'year_month'])['Category Score'].mean().reset_index()
-
-    # Calculate moving average
-    grouped_data['moving_average'] = grouped_data.groupby('composer')['Category Score'].transform(lambda x: x.rolling(window=months, min_periods=1).mean())
-
-    # Plotting
-    plt.figure(figsize=(14, 7))
-    for composer in ['Lennon', 'McCartney']:
+def parse_release_dates(release_dates):
+    '''
+    This function parses every release date at once, like refined_literal_date_parse
+    :param release_dates: The release dates, as dict strings ("{'year': 1963, 'month': 3, 'day': 22}") or already parsed
+    :type release_dates: pd.Series
+
+    :return: The dates, NaT when the year, month or day is missing
+    :rtype: pd.Series
+    '''
+    if pd.api.types.is_datetime64_any_dtype(release_dates):
+        return release_dates
+    release_dates = release_dates.astype(str)
+    components = pd.DataFrame({
+        part: pd.to_numeric(release_dates.str.extract(rf"'{part}':\s*(\d+)", expand=False), errors="coerce")
+        for part in ["year", "month", "day"]
+    })
+    return pd.to_datetime(components, errors="coerce")
+
+# Monthly scores of every dataset and moving averages of every (dataset, window), computed once
+monthly_scores_cache = {}
+moving_average_cache = {}
+
+def get_dataset_key(data):
+    # Hash of the columns used by the moving averages, so a changed dataset isn't served from the cache
+    columns = data[["composer", "release_date", "Category Score"]]
+    return hashlib.sha1(pd.util.hash_pandas_object(columns.astype({"release_date": "string"}), index=False).values.tobytes()).hexdigest()
+
+def get_monthly_scores(data):
+    # Average score of every composer for every month, parsing the dates only once per dataset
+    key = get_dataset_key(data)
+    if key not in monthly_scores_cache:
+        # The dataset itself is left untouched
+        year_month = parse_release_dates(data["release_date"]).dt.to_period("M")
+        monthly_scores_cache[key] = data["Category Score"].groupby([data["composer"], year_month.rename("year_month")]).mean().reset_index()
+    return key, monthly_scores_cache[key]
+
+def get_moving_averages(data, windows):
+    '''
+    This function calculates the moving averages of every composer for several windows from one grouping
+    :param data: The sentiment dataset
+    :type data: pd.DataFrame
+    :param windows: The window sizes, in months
+    :type windows: list
+
+    :return: A dictionary where keys are the windows and values are the monthly scores with their "moving_average"
+    :rtype: dict
+    '''
+    key, monthly_scores = get_monthly_scores(data)
+    missing = [months for months in windows if (key, months) not in moving_average_cache]
+    if len(missing) > 0:
+        scores_by_composer = monthly_scores.groupby("composer")["Category Score"]
+        for months in missing:
+            grouped_data = monthly_scores.copy()
+            grouped_data["moving_average"] = scores_by_composer.rolling(window=months, min_periods=1).mean().reset_index(level=0, drop=True)
+            moving_average_cache[(key, months)] = grouped_data
+    return {months: moving_average_cache[(key, months)] for months in windows}
+
+def get_moving_average(data, months):
+    # The monthly scores with the moving average of a single window
+    return get_moving_averages(data, [months])[months]
+
+def plot_moving_averages(ax, data, months, composers, linewidth=None):
+    # Plot the moving average of every composer on the axes
+    grouped_data = get_moving_average(data, months)
+    for composer in composers:
         subset = grouped_data[grouped_data['composer'] == composer]
-        plt.plot(pd.to_datetime(subset['year_month'].astype(str)), subset['moving_average'], label=f'{composer} {months}-Month MA')
-
-    now = datetime.now()
+        ax.plot(pd.to_datetime(subset['year_month'].astype(str)), subset['moving_average'], label=f'{composer} {months}-Month MA', linewidth=linewidth)
 
-    plt.title(f'{months}-Month Moving Average of Sentiment Scores')
-    plt.xlabel('Date')
-    plt.ylabel('Moving Average of Sentiment Score')
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.savefig(f'plots/moving_average_{months}_{now.strftime("%Y-%m-%d_%H-%M-%S")}.png')
-
-def calculate_and_plot_moving_average_historical(data, months, history):
-    # Convert release_date to datetime
-    data['release_date'] = data['release_date'].apply(refined_literal_date_parse)
-    data['year_month'] = data['release_date'].dt.to_period('M')
-    
-    # Group by composer and year_month, then calculate the average Category Score
-    grouped_data = data.groupby(['composer', 'year_month'])['Category Score'].mean().reset_index()
+def plot_historical_events(ax, history, fontsize=None):
+    # Draw a dashed line and a label at the date of every event
+    for event, date in history.items():
+        event_date = datetime.strptime(date, "%Y-%m-%d")
+        ax.axvline(x=event_date, color='k', linestyle='--')
+        bottom, top = ax.get_ylim()
+        ax.text(event_date + pd.to_timedelta(15, 'D'), top - 0.05 * (top - bottom), event, rotation=90, verticalalignment='top', fontsize=fontsize)
 
-    # Calculate moving average
-    grouped_data['moving_average'] = grouped_data.groupby('composer')['Category Score'].transform(lambda x: x.rolling(window=months, min_periods=1).mean())
+def set_year_ticks(ax):
+    # One tick per year on the x-axis
+    mdates = lazy_import("matplotlib.dates")
+    ax.xaxis.set_major_locator(mdates.YearLocator())
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
 
-    # Plotting
-    plt.figure(figsize=(14, 7))
-    for composer in ['Lennon', 'McCartney']:
-        subset = grouped_data[grouped_data['composer'] == composer]
-        plt.plot(pd.to_datetime(subset['year_month'].astype(str)), subset['moving_average'], label=f'{composer} {months}-Month MA')
+# Function to calculate and plot moving average of sentiment scores with specified granularity
+def calculate_and_plot_moving_average(data, months, composers=['Lennon', 'McCartney'], output_path=None):
+    fig = new_figure((14, 7))
+    ax = fig.add_subplot()
+    plot_moving_averages(ax, data, months, composers)
+
+    ax.set_title(f'{months}-Month Moving Average of Sentiment Scores')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Moving Average of Sentiment Score')
+    ax.legend()
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
+    return save_figure(fig, get_output_path(f"moving_average_{months}", output_path))
+
+def calculate_and_plot_moving_average_historical(data, months, history, composers=['Lennon', 'McCartney'], output_path=None):
+    fig = new_figure((14, 7))
+    ax = fig.add_subplot()
+    plot_moving_averages(ax, data, months, composers)
 
     # Plot historical events
-    for event, date in history.items():
-        event_date = datetime.strptime(date, "%Y-%m-%d")
-        plt.axvline(x=event_date, color='k', linestyle='--')
-        plt.text(event_date + pd.to_timedelta(15, 'D'), plt.ylim()[1] - 0.05 * (plt.ylim()[1] - plt.ylim()[0]), event, rotation=90, verticalalignment='top')
-
-    now = datetime.now()
+    plot_historical_events(ax, history)
 
-    plt.title(f'{months}-Month Moving Average of Sentiment Scores with Historical Events')
-    plt.xlabel('Date')
-    plt.ylabel('Moving Average of Sentiment Score')
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
+    ax.set_title(f'{months}-Month Moving Average of Sentiment Scores with Historical Events')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Moving Average of Sentiment Score')
+    ax.legend()
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
 
     # Adjust x-axis to better fit event labels
-    plt.gca().xaxis.set_major_locator(mdates.YearLocator())
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+    set_year_ticks(ax)
     
-    plt.tight_layout()
-    plt.savefig(f'plots/moving_average_historical_{months}_{now.strftime("%Y-%m-%d_%H-%M-%S")}.png')
+    fig.tight_layout()
+    return save_figure(fig, get_output_path(f"moving_average_historical_{months}", output_path))
 
-def calculate_and_plot_moving_average_historical_and_albums(data, months, history, beatles_albums_release):
-    # Assuming refined_literal_date_parse is a previously defined function
-    data['release_date'] = data['release_date'].apply(refined_literal_date_parse)
-    data['year_month'] = data['release_date'].dt.to_period('M')
-    
-    grouped_data = data.groupby(['composer', 'year_month'])['Category Score'].mean().reset_index()
-    grouped_data['moving_average'] = grouped_data.groupby('composer')['Category Score'].transform(lambda x: x.rolling(window=months, min_periods=1).mean())
-
-    plt.figure(figsize=(14, 7))
-    for composer in ['Lennon', 'McCartney']:
-        subset = grouped_data[grouped_data['composer'] == composer]
-        plt.plot(pd.to_datetime(subset['year_month'].astype(str)), subset['moving_average'], label=f'{composer} {months}-Month MA', linewidth=3)
-
-    for event, date in history.items():
-        event_date = datetime.strptime(date, "%Y-%m-%d")
-        plt.axvline(x=event_date, color='k', linestyle='--')
-        plt.text(event_date + pd.to_timedelta(15, 'D'), plt.ylim()[1] - 0.05 * (plt.ylim()[1] - plt.ylim()[0]), event, rotation=90, verticalalignment='top', fontsize=15)
+def calculate_and_plot_moving_average_historical_and_albums(data, months, history, beatles_albums_release, composers=['Lennon', 'McCartney'], output_path=None):
+    mpatches = lazy_import("matplotlib.patches")
+    fig = new_figure((14, 7))
+    ax = fig.add_subplot()
+    plot_moving_averages(ax, data, months, composers, linewidth=3)
+    plot_historical_events(ax, history, fontsize=15)
 
     # Generate a color palette that's large enough
-    colors = plt.cm.get_cmap('tab20', len(beatles_albums_release)).colors
+    colors = lazy_import("matplotlib").colormaps['tab20'].resampled(len(beatles_albums_release)).colors
 
     # Sort albums by release date
     sorted_albums = sorted(beatles_albums_release.items(), key=lambda x: x[1])
@@ -236,30 +365,119 @@ def calculate_and_plot_moving_average_historical_and_albums(data, months, histor
         else:
             end_date = start_date + pd.to_timedelta(250, 'D')  # Adjust as needed
         
-        plt.axvspan(start_date, end_date, color=colors[i], alpha=0.3)
+        ax.axvspan(start_date, end_date, color=colors[i], alpha=0.3)
         patches.append(mpatches.Patch(color=colors[i], label=album))
     
 
-    plt.title(f'{months}-Month Moving Average of Sentiment Scores with Historical Events and Beatles Albums', fontsize=16)
-    plt.xlabel('Date', fontsize=14)
-    plt.ylabel('Moving Average of Sentiment Score', fontsize=14)
+    ax.set_title(f'{months}-Month Moving Average of Sentiment Scores with Historical Events and Beatles Albums', fontsize=16)
+    ax.set_xlabel('Date', fontsize=14)
+    ax.set_ylabel('Moving Average of Sentiment Score', fontsize=14)
     # Create two legends: one for the moving average lines, one for the albums
-    first_legend = plt.legend(handles=patches, bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=15, title="Albums")
-    plt.gca().add_artist(first_legend)
+    first_legend = ax.legend(handles=patches, bbox_to_anchor=(1.01, 1), loc='upper left', fontsize=15, title="Albums")
+    ax.add_artist(first_legend)
     
-    # The second legend for the moving averages is added automatically when you call plt.legend() without handles
-    plt.legend(loc='upper left', bbox_to_anchor=(1.01, 0.35), fontsize=15, title="Moving Averages")
-    plt.subplots_adjust(right=2.75)  # Adjust the right space of the subplots to fit the legend
-    plt.grid(True)
-    plt.xticks(rotation=45, fontsize=12)
-
-    plt.gca().xaxis.set_major_locator(mdates.YearLocator())
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-    
-    plt.tight_layout()
+    # The second legend for the moving averages uses the labels of the lines
+    ax.legend(loc='upper left', bbox_to_anchor=(1.01, 0.35), fontsize=15, title="Moving Averages")
+    fig.subplots_adjust(right=2.75)  # Adjust the right space of the subplots to fit the legend
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45, labelsize=12)
 
-    now = datetime.now()
-    plt.savefig(f'plots/moving_average_albums_{months}_{now.strftime("%Y-%m-%d_%H-%M-%S")}.png')
+    set_year_ticks(ax)
+    
+    fig.tight_layout()
+    return save_figure(fig, get_output_path(f"moving_average_albums_{months}", output_path))
+
+def plot_historical_events_report(data, months, composers, output_path):
+    # Moving average report with the events of the history dictionary
+    return calculate_and_plot_moving_average_historical(data, months, history, composers, output_path)
+
+def plot_albums_report(data, months, composers, output_path):
+    # Moving average report with the events and the Beatles albums
+    return calculate_and_plot_moving_average_historical_and_albums(data, months, history, beatles_albums_release, composers, output_path)
+
+# Reports of the runner: the function and whether it uses a moving average window
+report_functions = {
+    "distribution": (create_distribution_plot, False),
+    "unique_cloud": (create_unique_word_cloud, False),
+    "moving_average": (calculate_and_plot_moving_average, True),
+    "historical_events": (plot_historical_events_report, True),
+    "albums": (plot_albums_report, True),
+}
+
+# Reports reading the token and POS index of the songs
+lexical_reports = ["unique_cloud"]
+
+# Dataset of the report worker processes
+report_data = None
+
+def init_report_worker(data, monthly_scores, moving_averages, lexical_indexes):
+    # Keep the dataset, the moving averages and the lexical index in the worker, they are sent once per process instead of once per report
+    global report_data
+    report_data = data
+    monthly_scores_cache.update(monthly_scores)
+    moving_average_cache.update(moving_averages)
+    lexical_index_cache.update(lexical_indexes)
+
+def render_report(task):
+    # Render one (report, window, composers) task with the dataset of the worker
+    report, months, composers, output_path = task
+    function, uses_window = report_functions[report]
+    if uses_window:
+        return function(report_data, months, composers, output_path)
+    return function(report_data, composers, output_path)
+
+def get_report_tasks(reports, windows, composer_sets):
+    '''
+    This function lists every (report, window, composers) plot to render
+    :param reports: The names of the reports, keys of report_functions
+    :type reports: list
+    :param windows: The window sizes of the moving averages, in months
+    :type windows: list
+    :param composer_sets: The lists of composers, one plot is made for every list
+    :type composer_sets: list
+
+    :return: The tasks, with the output path of every plot
+    :rtype: list
+    '''
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    tasks = []
+    for report in reports:
+        # The reports without a moving average are made once per composer list
+        report_windows = windows if report_functions[report][1] else [None]
+        for months in report_windows:
+            for composers in composer_sets:
+                name = report if months is None else f"{report}_{months}"
+                tasks.append((report, months, composers, f'plots/{name}_{"-".join(composers)}_{timestamp}.png'))
+    return tasks
+
+def run_reports(data, reports, windows, composer_sets, workers=None, index_path="sentiment_scores/lexical_index.npz"):
+    '''
+    This function renders every (report, window, composers) plot, in a process pool if workers is given
+    :param data: The sentiment dataset
+    :type data: pd.DataFrame
+    :param workers: The number of processes, None renders the plots one after another in this process
+    :type workers: int
+    :param index_path: The path of the saved token and POS index, used by the lexical reports
+    :type index_path: str
+
+    :return: The paths of the saved plots
+    :rtype: list
+    '''
+    tasks = get_report_tasks(reports, windows, composer_sets)
+    # Parse the dates and calculate the moving averages of every window once for all the reports
+    if any(report_functions[report][1] for report in reports):
+        get_moving_averages(data, windows)
+    # Build or load the lexical index once too, so the workers don't all tag the songs and write the same files
+    if any(report in lexical_reports for report in reports):
+        get_lexical_index(data, index_path)
+    if workers is None:
+        init_report_worker(data, {}, {}, {})
+        return [render_report(task) for task in tasks]
+    # Spawned workers import this module again, which only loads pandas
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_report_worker, initargs=(data, monthly_scores_cache, moving_average_cache, lexical_index_cache)) as executor:
+        return list(executor.map(render_report, tasks))
 
 if __name__ == "__main__":
     # Downloads
@@ -268,12 +486,21 @@ if __name__ == "__main__":
     #nltk.download('stopwords')
     #nltk.download('wordnet')
     ### CONFIG ###
-    perform_distribution = False
-    perform_unique_cloud = False
-    perform_moving_average = False
-    perform_historical_events = False
-    perform_albums = True
+    # Reports to render: "distribution", "unique_cloud", "moving_average", "historical_events" and "albums"
+    reports = ["albums"]
+    # Window sizes of the moving averages, in months
+    moving_average_windows = [6]
+    # One plot of every report is made for every list of composers
+    composer_sets = [['Lennon', 'McCartney']]
+    # Number of processes rendering the plots (None renders them one after another)
+    report_workers = None
     path = "sentiment_scores/sentiment_analysis_beatles.csv"
+    # Path of the token and POS index of the songs, built the first time a lexical report or the word counts need it
+    lexical_index_path = "sentiment_scores/lexical_index.npz"
+    # Path of the word counts of every song (like beatles_word_counts.csv), None doesn't save them
+    word_counts_path = None
+    # Print the time spent on every import and model load at the end
+    report_startup = True
     ##############
     # Check if the path is empty
     if path == None or path == "" or not os.path.exists(path):
@@ -282,30 +509,19 @@ if __name__ == "__main__":
         if not os.path.exists(path):
             print("File does not exist.")
             exit()
-    # Load the dataset
-    data = pd.read_csv(path)
-
-    # Perform distribution plot?
-    if perform_distribution:
-        create_distribution_plot(data)
-
-    # Perform unique word cloud?
-    if perform_unique_cloud:
-        create_unique_word_cloud(data)
-
-    # Perform evolution of scores over time?
-    if perform_moving_average:
-        calculate_and_plot_moving_average(data, 6)
-
-    # Perform evolution of scores over time with historical events?
-    if perform_historical_events:
-        calculate_and_plot_moving_average_historical(data, 6, history)
-
-    # Perform evolution of scores over time with historical events and Beatles albums?
-    if perform_albums:
-        calculate_and_plot_moving_average_historical_and_albums(data, 6, history, beatles_albums_release)
-        
-    
-
-
-    
+    # Load the dataset (a csv file or a corpus store folder)
+    load_dataset = lazy_import("data_gathering_helpers.corpus_store").load_dataset
+    data = load_dataset(path)
+
+    # Render every report for every window and list of composers
+    for output_path in run_reports(data, reports, moving_average_windows, composer_sets, report_workers, lexical_index_path):
+        print(f"Saved {output_path}")
+
+    # Save the word counts from the index
+    if word_counts_path is not None:
+        get_lexical_index(data, lexical_index_path).get_word_count_frame().to_csv(word_counts_path, index=False)
+        print(f"Saved {word_counts_path}")
+
+    # Show where the startup time went
+    if report_startup:
+        print_startup_report()
@@ -0,0 +1,239 @@
+# Imports
+import os
+from io import StringIO
+import numpy as np
+import pandas as pd
+
+class LexicalIndex:
+    def __init__(self, vocabulary, tags, term_words, term_tags, indptr, indices, counts, songs, dataset_key=None):
+        '''
+        This class keeps the tokens of every song as sparse term counts, so the lexical statistics are array operations
+        A term is a (word, POS tag) pair, the counts of every song are the row of a CSR matrix of songs by terms
+        :param vocabulary: The words, in order of first appearance
+        :type vocabulary: np.ndarray
+        :param tags: The POS tags
+        :type tags: np.ndarray
+        :param term_words: The position in the vocabulary of the word of every term
+        :type term_words: np.ndarray
+        :param term_tags: The position in tags of the POS tag of every term
+        :type term_tags: np.ndarray
+        :param indptr: The CSR row pointers, the terms of song i are indices[indptr[i]:indptr[i + 1]]
+        :type indptr: np.ndarray
+        :param indices: The CSR term positions
+        :type indices: np.ndarray
+        :param counts: The CSR counts, the number of times the song uses the term
+        :type counts: np.ndarray
+        :param songs: The columns of the dataset describing every song (song_name, composer...)
+        :type songs: pd.DataFrame
+        :param dataset_key: The key of the dataset the index was built from
+        :type dataset_key: str
+        '''
+        self.vocabulary = vocabulary
+        self.tags = tags
+        self.term_words = term_words
+        self.term_tags = term_tags
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.songs = songs.reset_index(drop=True)
+        self.dataset_key = dataset_key
+        # Song of every stored count
+        self.entry_rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    @classmethod
+    def from_tokens(cls, song_tokens, songs, dataset_key=None):
+        '''
+        This function builds the index from the (word, POS tag) pairs of every song
+        :param song_tokens: The (word, POS tag) pairs of every song, like the ones of the token cache
+        :type song_tokens: list
+        :param songs: The columns of the dataset describing every song, one row per song
+        :type songs: pd.DataFrame
+
+        :return: The index
+        :rtype: LexicalIndex
+        '''
+        word_positions, tag_positions, term_positions = {}, {}, {}
+        term_words, term_tags = [], []
+        indptr, indices, counts = [0], [], []
+        for tokens in song_tokens:
+            song_counts = {}
+            for word, tag in tokens:
+                term = term_positions.get((word, tag))
+                if term is None:
+                    term = term_positions[(word, tag)] = len(term_positions)
+                    term_words.append(word_positions.setdefault(word, len(word_positions)))
+                    term_tags.append(tag_positions.setdefault(tag, len(tag_positions)))
+                song_counts[term] = song_counts.get(term, 0) + 1
+            indices.extend(song_counts.keys())
+            counts.extend(song_counts.values())
+            indptr.append(len(indices))
+        return cls(
+            np.array(list(word_positions), dtype=str),
+            np.array(list(tag_positions), dtype=str),
+            np.array(term_words, dtype=np.int32),
+            np.array(term_tags, dtype=np.int32),
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(counts, dtype=np.int32),
+            songs,
+            dataset_key,
+        )
+
+    def save(self, path):
+        # Every array goes in one npz file, the song columns are kept as json
+        # The file is written next to the index and renamed, so a reader never sees a half written index
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez_compressed(
+                file,
+                vocabulary=self.vocabulary,
+                tags=self.tags,
+                term_words=self.term_words,
+                term_tags=self.term_tags,
+                indptr=self.indptr,
+                indices=self.indices,
+                counts=self.counts,
+                songs=np.array(self.songs.astype(str).to_json(orient="split")),
+                dataset_key=np.array("" if self.dataset_key is None else self.dataset_key),
+            )
+        os.replace(temporary_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            songs = pd.read_json(StringIO(str(arrays["songs"])), orient="split", dtype=False)
+            dataset_key = str(arrays["dataset_key"]) or None
+            return cls(arrays["vocabulary"], arrays["tags"], arrays["term_words"], arrays["term_tags"], arrays["indptr"], arrays["indices"], arrays["counts"], songs, dataset_key)
+
+    def get_rows(self, column=None, values=None):
+        # Positions of the songs whose column is one of the values, every song if no column is given
+        if column is None:
+            return np.arange(len(self.songs))
+        if isinstance(values, str):
+            values = [values]
+        return np.flatnonzero(self.songs[column].isin(values).to_numpy())
+
+    def get_word_counts(self, rows=None, tags=None, stopwords=None, documents=False):
+        '''
+        This function counts the words of the selected songs
+        :param rows: The positions of the songs, None counts every song
+        :type rows: np.ndarray
+        :param tags: Only count the words tagged with one of these POS tags, like ["ADJ"]
+        :type tags: list
+        :param stopwords: The words to leave out, their count is 0
+        :type stopwords: set
+        :param documents: Count the songs using every word instead of the times it is used
+        :type documents: bool
+
+        :return: The count of every word of the vocabulary
+        :rtype: np.ndarray
+        '''
+        mask = np.ones(len(self.indices), dtype=bool)
+        if rows is not None:
+            selected = np.zeros(len(self.songs), dtype=bool)
+            selected[rows] = True
+            mask &= selected[self.entry_rows]
+        if tags is not None:
+            mask &= np.isin(self.tags[self.term_tags], list(tags))[self.indices]
+        words = self.term_words[self.indices[mask]]
+        if documents:
+            # A word with several tags in a song is stored once per tag, but the song is counted once
+            pairs = np.unique(self.entry_rows[mask].astype(np.int64) * len(self.vocabulary) + words)
+            word_counts = np.bincount(pairs % len(self.vocabulary), minlength=len(self.vocabulary))
+        else:
+            word_counts = np.bincount(words, weights=self.counts[mask], minlength=len(self.vocabulary)).astype(np.int64)
+        if stopwords:
+            word_counts[np.isin(self.vocabulary, list(stopwords))] = 0
+        return word_counts
+
+    def to_frequencies(self, word_counts):
+        # Dictionary of the words with a count, for the word clouds
+        present = np.flatnonzero(word_counts)
+        return dict(zip(self.vocabulary[present].tolist(), word_counts[present].tolist()))
+
+    def get_word_count_frame(self, rows=None, tags=None, stopwords=None):
+        # Table of the words and their counts, in order of first appearance like beatles_word_counts.csv
+        word_counts = self.get_word_counts(rows, tags, stopwords)
+        present = np.flatnonzero(word_counts)
+        return pd.DataFrame({"Word": self.vocabulary[present], "Count": word_counts[present]})
+
+    def get_unique_words(self, groups, tags=None, stopwords=None):
+        '''
+        This function counts the words of every group of songs that no other group uses
+        :param groups: The name and the song positions of every group, like {"Lennon": rows}
+        :type groups: dict
+        :param tags: Only count the unique words tagged with one of these POS tags
+        :type tags: list
+        :param stopwords: The words to leave out
+        :type stopwords: set
+
+        :return: The counts of the unique words of every group
+        :rtype: dict
+        '''
+        # A word is unique to a group when no other group uses it, whatever its tag
+        used = {name: self.get_word_counts(rows, stopwords=stopwords) > 0 for name, rows in groups.items()}
+        users = np.sum(list(used.values()), axis=0)
+        unique_counts = {}
+        for name, rows in groups.items():
+            word_counts = self.get_word_counts(rows, tags, stopwords)
+            word_counts[users - used[name] > 0] = 0
+            unique_counts[name] = word_counts
+        return unique_counts
+
+    def get_tf_idf(self, rows=None, stopwords=None):
+        '''
+        This function weights the words of every song with TF-IDF
+        :param rows: The positions of the songs, None uses every song
+        :type rows: np.ndarray
+        :param stopwords: The words to leave out
+
+        :return: The CSR matrix (indptr, word positions, weights) of the selected songs by words
+        :rtype: tuple
+        '''
+        rows = self.get_rows() if rows is None else np.asarray(rows)
+        vocabulary_size = len(self.vocabulary)
+        # Position of every stored count among the selected songs, -1 when its song isn't selected
+        positions = np.full(len(self.songs), -1)
+        positions[rows] = np.arange(len(rows))
+        entries = np.flatnonzero(positions[self.entry_rows] >= 0)
+        new_rows = positions[self.entry_rows[entries]]
+        # Merge the tags of every word of a song
+        words = self.term_words[self.indices[entries]]
+        keep = ~np.isin(self.vocabulary[words], list(stopwords)) if stopwords else np.ones(len(words), dtype=bool)
+        pairs, inverse = np.unique(new_rows[keep].astype(np.int64) * vocabulary_size + words[keep], return_inverse=True)
+        word_counts = np.bincount(inverse, weights=self.counts[entries][keep], minlength=len(pairs))
+        pair_rows, pair_words = pairs // vocabulary_size, pairs % vocabulary_size
+        # Term frequency in the song times the smoothed inverse document frequency over the selected songs
+        song_lengths = np.bincount(pair_rows, weights=word_counts, minlength=len(rows))
+        document_frequency = np.bincount(pair_words, minlength=vocabulary_size)
+        idf = np.log((1 + len(rows)) / (1 + document_frequency)) + 1
+        weights = word_counts / song_lengths[pair_rows] * idf[pair_words]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(pair_rows, minlength=len(rows)))])
+        return indptr, pair_words, weights
+
+    def get_contrast(self, first_rows, second_rows, tags=None, stopwords=None, smoothing=0.5):
+        '''
+        This function compares how much two groups of songs use every word, with the smoothed log ratio of their frequencies
+        :param first_rows: The positions of the songs of the first group
+        :type first_rows: np.ndarray
+        :param second_rows: The positions of the songs of the second group
+        :type second_rows: np.ndarray
+        :param smoothing: The count added to every word, so the words of only one group have a finite ratio
+        :type smoothing: float
+
+        :return: The log ratio of every word, positive when the first group uses it more
+        :rtype: np.ndarray
+        '''
+        first_counts = self.get_word_counts(first_rows, tags, stopwords)
+        second_counts = self.get_word_counts(second_rows, tags, stopwords)
+        used = (first_counts + second_counts) > 0
+        first_frequency = (first_counts + smoothing) / (first_counts.sum() + smoothing * used.sum())
+        second_frequency = (second_counts + smoothing) / (second_counts.sum() + smoothing * used.sum())
+        # Words neither group uses have no ratio
+        return np.where(used, np.log(first_frequency / second_frequency), 0.0)
+
+    def get_top_words(self, scores, n=20):
+        # The n words with the highest score, highest first
+        order = np.argsort(-scores, kind="stable")[:n]
+        return list(zip(self.vocabulary[order].tolist(), scores[order].tolist()))
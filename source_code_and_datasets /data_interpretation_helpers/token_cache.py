@@ -0,0 +1,58 @@
+# Imports
+import sqlite3
+import hashlib
+import json
+
+class TokenCache:
+    def __init__(self, path, model_name):
+        # Save the configuration
+        self.path = path
+        self.model_name = model_name
+        # Open the database and create the table if it doesn't exist yet
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS song_tokens ("
+            "key TEXT PRIMARY KEY, "
+            "model_name TEXT, "
+            "tokens TEXT)"
+        )
+        self.connection.commit()
+
+    def get_key(self, lyrics):
+        # The key is the hash of the model and of the lyrics of the song
+        return hashlib.sha256(json.dumps([self.model_name, lyrics]).encode("utf-8")).hexdigest()
+
+    def get_many(self, lyrics_list):
+        '''
+        This function looks up the tokens of several songs at once
+        :param lyrics_list: The lyrics of every song
+        :type lyrics_list: list
+
+        :return: A list with the (word, POS tag) pairs of every song, None where it is not cached
+        :rtype: list
+        '''
+        keys = [self.get_key(lyrics) for lyrics in lyrics_list]
+        found = {}
+        # Query in slices to stay under the sqlite variable limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(f"SELECT key, tokens FROM song_tokens WHERE key IN ({placeholders})", batch)
+            for key, tokens in rows:
+                found[key] = [tuple(token) for token in json.loads(tokens)]
+        return [found.get(key) for key in keys]
+
+    def put_many(self, lyrics_list, tokens_list):
+        '''
+        This function stores the tokens of several songs
+        :param lyrics_list: The lyrics of every song
+        :type lyrics_list: list
+        :param tokens_list: The (word, POS tag) pairs of every song
+        :type tokens_list: list
+        '''
+        rows = [(self.get_key(lyrics), self.model_name, json.dumps(tokens)) for lyrics, tokens in zip(lyrics_list, tokens_list)]
+        self.connection.executemany("INSERT OR REPLACE INTO song_tokens VALUES (?, ?, ?)", rows)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
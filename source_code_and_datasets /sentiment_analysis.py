@@ -1,86 +1,539 @@
 import re, os 
-from transformers import pipeline
+import hashlib
+import json
+from collections import Counter
 import pandas as pd
+import numpy as np
 import datetime
 from tqdm import tqdm
 
+# My classes
+from sentiment_analysis_helpers.score_cache import ScoreCache
+from sentiment_analysis_helpers.process_pool import score_chunks_in_processes
+from sentiment_analysis_helpers.lyrics_dedup import LyricsDeduplicator
+from sentiment_analysis_helpers.backends import create_backend, get_cache_name, default_models
+
 # ooh, woo, tchic, nananana, mm, da, ah, h
 singing = ["ooh", "la", "nananana", "oh", "ah", "woo", "tchic", "mm", "da", "hoo", "tit"]
 
-def split_lyrics(lyrics, chunk_size=512):
-    words = lyrics.split()
-    chunks = []
+def load_dataset(path, columns=None):
+    # Read a csv file or a corpus store folder, the corpus store (and pyarrow) is only imported for a folder
+    if os.path.isdir(path):
+        from data_gathering_helpers.corpus_store import read_corpus
+        return read_corpus(path, columns)
+    return pd.read_csv(path, usecols=columns)
+
+def build_removal_pattern(words):
+    # Longest words first so a word is never cut short by one of its prefixes
+    words = sorted(set(word.lower() for word in words), key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b", flags=re.IGNORECASE)
+
+def filter_lyrics(lyrics, remove_love, remove_singing, extra_words=None):
+    '''
+    This function removes the unwanted words from the lyrics in a single pass
+    :param lyrics: The lyrics of every song
+    :type lyrics: pd.Series
+    :param remove_love: Whether to remove the word love
+    :type remove_love: bool
+    :param remove_singing: Whether to remove the singing words (ooh, la, ...)
+    :type remove_singing: bool
+    :param extra_words: Additional words to remove
+    :type extra_words: list
+
+    :return: The filtered lyrics, the number of times every word was removed
+    :rtype: pd.Series
+    :rtype: Counter
+    '''
+    # Gather every word to remove
+    words = []
+    if remove_love:
+        words.append("love")
+    if remove_singing:
+        words.extend(singing)
+    if extra_words is not None:
+        words.extend(extra_words)
+    removed_counts = Counter()
+    if len(words) == 0:
+        return lyrics, removed_counts
+    # Build one compiled alternation and count the removed words while replacing
+    pattern = build_removal_pattern(words)
+    def remove_word(match):
+        removed_counts[match.group(0).lower()] += 1
+        return ""
+    lyrics = lyrics.fillna("").str.replace(pattern, remove_word, regex=True)
+    return lyrics, removed_counts
+
+def iter_lyric_chunks(lyrics, chunk_size=512, tokenizer=None, overlap=0):
+    '''
+    This function lazily splits the lyrics into chunks of at most chunk_size
+    :param lyrics: The lyrics of the song
+    :type lyrics: str
+    :param chunk_size: The maximum length of a chunk, in characters or in tokens if a tokenizer is given
+    :type chunk_size: int
+    :param tokenizer: The tokenizer of the pipeline, used to measure the words in tokens
+    :type tokenizer: transformers.PreTrainedTokenizer
+    :param overlap: The number of words repeated at the start of the next chunk
+    :type overlap: int
+
+    :return: A generator of the chunks
+    :rtype: generator
+    '''
+    # Measure the words in characters (plus one space between words) or in tokens
+    if tokenizer is None:
+        measure = len
+        separator = 1
+    else:
+        # Lyrics repeat a lot, so remember the token count of every word
+        token_counts = {}
+        def measure(word):
+            if word not in token_counts:
+                token_counts[word] = len(tokenizer.tokenize(" " + word))
+            return token_counts[word]
+        separator = 0
+
     current_chunk = []
+    current_lengths = []
+    # Running length of the current chunk, so it is never joined just to be measured
+    current_length = 0
 
-    for word in words:
-        if len(" ".join(current_chunk)) + len(word) + 1 <= chunk_size:
-            current_chunk.append(word)
-        else:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
+    for word in lyrics.split():
+        word_length = measure(word)
+        if current_chunk and current_length + word_length + separator > chunk_size:
+            yield " ".join(current_chunk)
+            # Carry the last words over into the next chunk, always leaving room for progress
+            keep = min(overlap, len(current_chunk) - 1)
+            current_chunk = current_chunk[len(current_chunk) - keep:]
+            current_lengths = current_lengths[len(current_lengths) - keep:]
+            current_length = sum(current_lengths) + separator * max(len(current_lengths) - 1, 0)
+            # Drop carried words until the new word fits
+            while current_chunk and current_length + word_length + separator > chunk_size:
+                current_chunk.pop(0)
+                current_length -= current_lengths.pop(0) + (separator if current_chunk else 0)
+        # Add the word and update the running length
+        if current_chunk:
+            current_length += separator
+        current_chunk.append(word)
+        current_lengths.append(word_length)
+        current_length += word_length
 
     if current_chunk:
-        chunks.append(" ".join(current_chunk))
+        yield " ".join(current_chunk)
+
+def split_lyrics(lyrics, chunk_size=512, tokenizer=None, overlap=0):
+    # Get all the chunks of the lyrics as a list
+    return list(iter_lyric_chunks(lyrics, chunk_size, tokenizer, overlap))
+
+def get_probability_column(label):
+    # Name of the column holding the average probability of a label
+    return label + " Probability"
+
+def build_score_matrix(results, labels):
+    # Put the classifier output into a (chunks x labels) matrix, columns in the order of labels
+    label_positions = {label: i for i, label in enumerate(labels)}
+    matrix = np.zeros((len(results), len(labels)))
+    for row, sentiments in enumerate(results):
+        for label, score in zip(sentiments["labels"], sentiments["scores"]):
+            matrix[row, label_positions[label]] = score
+    return matrix
+
+def fold_chunk_scores(song_positions, matrix, labels, mapping, total_songs):
+    '''
+    This function averages the chunk scores of every song
+    :param song_positions: The position of the song of every chunk
+    :type song_positions: np.ndarray
+    :param matrix: The (chunks x labels) score matrix
+    :type matrix: np.ndarray
+    :param total_songs: The number of songs
+    :type total_songs: int
+
+    :return: The (songs x labels) average probabilities, the weighted score of every song
+    :rtype: np.ndarray
+    :rtype: np.ndarray
+    '''
+    # Average the label probabilities of the chunks of every song, songs without chunks stay at 0
+    total_chunks = np.bincount(song_positions, minlength=total_songs)
+    probabilities = np.zeros((total_songs, len(labels)))
+    np.add.at(probabilities, song_positions, matrix)
+    has_chunks = total_chunks > 0
+    probabilities[has_chunks] /= total_chunks[has_chunks, None]
+    # The weighted score is linear, so weighting the averages equals averaging the weighted chunks
+    weights = np.array([mapping[label] for label in labels], dtype=float)
+    return probabilities, probabilities @ weights
+
+def assign_categories(scores, mapping):
+    '''
+    This function finds the category whose mapping value is closest to every score
+    :param scores: The final scores
+    :type scores: np.ndarray
+    :param mapping: The mapping from categories to scores
+    :type mapping: dict
+
+    :return: The category of every score
+    :rtype: np.ndarray
+    '''
+    scores = np.asarray(scores, dtype=float)
+    # Sort the mapping values once, the first category wins between equal values
+    values = np.array(list(mapping.values()), dtype=float)
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    sorted_categories = np.array(list(mapping.keys()), dtype=object)[order]
+    if len(sorted_values) == 1:
+        return np.full(len(scores), sorted_categories[0], dtype=object)
+    # Compare every score with the sorted values on both sides of it, the lower one wins ties
+    right = np.clip(np.searchsorted(sorted_values, scores), 1, len(sorted_values) - 1)
+    left = right - 1
+    closest = np.where(np.abs(scores - sorted_values[left]) <= np.abs(sorted_values[right] - scores), left, right)
+    return sorted_categories[closest]
+
+def rebucket_categories(dataframe, labels, mapping):
+    # Recompute the scores and categories from the probability columns, without running the model
+    probabilities = dataframe[[get_probability_column(label) for label in labels]].to_numpy(dtype=float)
+    weights = np.array([mapping[label] for label in labels], dtype=float)
+    dataframe["Category Score"] = probabilities @ weights
+    dataframe["Category"] = assign_categories(dataframe["Category Score"].to_numpy(), mapping)
+    return dataframe
+
+def score_chunks_batched(classifier, labels, work_list, batch_size, cache=None, workers=None, threads_per_worker=1, backend="zero-shot", model_name=None, mapping=None):
+    '''
+    This function scores a flat list of chunks with the classifier in batches
+    :param work_list: A list of (index, chunk) tuples from every song
+    :type work_list: list
+    :param batch_size: The number of chunks sent through the pipeline together, the zero-shot model sees one pair per label of every chunk
+    :type batch_size: int
+    :param cache: The cache of previously scored chunks, only the missing chunks are scored
+    :type cache: ScoreCache
+    :param workers: The number of worker processes, None scores the chunks with the given classifier
+    :type workers: int
+    :param backend: The name of the backend created by the worker processes
+    :type backend: str
+
+    :return: A list with the classifier output of every chunk, in work list order
+    :rtype: list
+    '''
+    chunks = [chunk for _, chunk in work_list]
+    # Get the cached scores, only the chunks without one go through the model
+    if cache is not None:
+        results = cache.get_many(chunks, labels)
+    else:
+        results = [None] * len(chunks)
+    missing = [i for i, sentiments in enumerate(results) if sentiments is None]
+    # Let a pool of processes score the missing chunks if workers are requested
+    if workers is not None:
+        # No pool is started when every chunk was already cached
+        if len(missing) > 0:
+            missing_chunks = [chunks[i] for i in missing]
+            on_shard_done = None
+            if cache is not None:
+                on_shard_done = lambda batch, sentiments: cache.put_many(batch, labels, sentiments)
+            missing_results = score_chunks_in_processes(missing_chunks, labels, backend, model_name, mapping, batch_size, workers, threads_per_worker, on_shard_done)
+            for i, chunk_sentiments in zip(missing, missing_results):
+                results[i] = chunk_sentiments
+        return results
+    # Send the missing chunks through the pipeline in slices so the progress bar moves
+    for start in tqdm(range(0, len(missing), batch_size)):
+        batch_indices = missing[start:start + batch_size]
+        batch = [chunks[i] for i in batch_indices]
+        sentiments = classifier(batch, candidate_labels=labels, batch_size=batch_size)
+        # The pipeline returns a dict instead of a list when given a single chunk
+        if isinstance(sentiments, dict):
+            sentiments = [sentiments]
+        for i, chunk_sentiments in zip(batch_indices, sentiments):
+            results[i] = chunk_sentiments
+        # Save the new scores straight away
+        if cache is not None:
+            cache.put_many(batch, labels, sentiments)
+    return results
+
+class SentimentScorer:
+    def __init__(self, labels, mapping, batch_size=None, cache_path=None, cache_max_entries=1000000, workers=None, threads_per_worker=1, model_name=None, chunk_size=512, token_chunks=False, chunk_overlap=0, backend="zero-shot", dedup_threshold=None):
+        # Save the configuration
+        self.labels = labels
+        self.mapping = mapping
+        self.batch_size = batch_size
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.backend = backend
+        self.model_name = model_name if model_name is not None else default_models[backend]
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # The model is only loaded once there is something to score
+        self.classifier = None
+        # Songs with near-identical lyrics share the score of one of them (None scores every song)
+        self.deduplicator = LyricsDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+
+        # Measure the chunks in model tokens instead of characters if requested
+        self.tokenizer = None
+        if token_chunks:
+            # Only the Hugging Face models have a tokenizer
+            if backend in ["lexicon", "stub"]:
+                raise ValueError(f"The {backend} backend has no tokenizer, use character chunks (token_chunks=False)")
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+
+        # Open the chunk score cache if a path is given
+        self.cache_name = get_cache_name(backend, self.model_name, mapping)
+        self.cache = None
+        if cache_path is not None:
+            self.cache = ScoreCache(cache_path, self.cache_name, max_entries=cache_max_entries)
+
+        # Hash of everything that changes the score of a song apart from its lyrics
+        settings = [self.cache_name, list(labels), mapping, chunk_size, token_chunks, chunk_overlap]
+        if dedup_threshold is not None:
+            settings.append(dedup_threshold)
+        self.scoring_hash = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get_classifier(self):
+        # Load the scoring backend, the worker processes load their own copy
+        if self.classifier is None and self.workers is None:
+            self.classifier = create_backend(self.backend, self.model_name, self.mapping)
+        return self.classifier
+
+    def score_rows(self, dataframe):
+        '''
+        This function sets the "Category" and "Category Score" of every row of the dataframe
+        :param dataframe: The songs to score, with their filtered lyrics in the "lyrics" column
+        :type dataframe: pd.DataFrame
+
+        :return: The dataframe with the scores
+        :rtype: pd.DataFrame
+        '''
+        if len(dataframe) == 0:
+            return dataframe
+        lyrics_list = dataframe["lyrics"].tolist()
+        if self.deduplicator is None:
+            probabilities, song_scores = self.score_lyrics(lyrics_list)
+        else:
+            # Only score the first song of every group of near-identical lyrics and copy its scores to the others
+            representatives = self.deduplicator.find_groups(lyrics_list)
+            unique_positions, group_index = np.unique(representatives, return_inverse=True)
+            print(f"Scoring {len(unique_positions)} songs for {len(lyrics_list)} rows with near-duplicate lyrics grouped.")
+            probabilities, song_scores = self.score_lyrics([lyrics_list[position] for position in unique_positions])
+            probabilities, song_scores = probabilities[group_index], song_scores[group_index]
+        # Set the category based on the final score using the mapping dictionary
+        dataframe["Category Score"] = song_scores
+        dataframe["Category"] = assign_categories(song_scores, self.mapping)
+        # Keep the average probability of every label so the songs can be re-bucketed later
+        for i, label in enumerate(self.labels):
+            dataframe[get_probability_column(label)] = probabilities[:, i]
 
-    return chunks
+        # return the dataframe
+        return dataframe
 
-def perform_sentiment_analysis(labels, mapping, data_path, remove_love, remove_singing):
-    # Load the sentiment-analysis model
-    classifier = pipeline("zero-shot-classification")
+    def score_lyrics(self, lyrics_list):
+        '''
+        This function scores the lyrics of every song
+        :param lyrics_list: The filtered lyrics of every song
+        :type lyrics_list: list
 
-    # Get the data from the dataframe
-    dataframe = pd.read_csv(data_path)
+        :return: The average label probabilities (songs x labels) and the score of every song
+        :rtype: tuple
+        '''
+        classifier = self.get_classifier()
+        labels = self.labels
+        mapping = self.mapping
+        cache = self.cache
 
+        # Flatten the chunks of every song into a single work list of (song position, chunk)
+        work_list = []
+        for position, lyrics in enumerate(lyrics_list):
+            for chunk in iter_lyric_chunks(lyrics, self.chunk_size, self.tokenizer, self.chunk_overlap):
+                work_list.append((position, chunk))
+
+        # If a batch size or workers are given, score the chunks of every song together
+        if self.batch_size is not None or self.workers is not None:
+            # The worker processes get their chunks in shards of the batch size
+            batch_size = self.batch_size if self.batch_size is not None else 16
+            # Run the whole work list through the pipeline
+            results = score_chunks_batched(classifier, labels, work_list, batch_size, cache, self.workers, self.threads_per_worker, self.backend, self.model_name, mapping)
+        else:
+            # Analyze the sentiment of each chunk one at a time
+            results = []
+            for _, chunk in tqdm(work_list):
+                sentiments = cache.get(chunk, labels) if cache is not None else None
+                if sentiments is None:
+                    sentiments = classifier(chunk, candidate_labels=labels)
+                    if cache is not None:
+                        cache.put(chunk, labels, sentiments)
+                results.append(sentiments)
+
+        # Fold the chunk scores back into their songs as array operations
+        song_positions = np.array([position for position, _ in work_list], dtype=int)
+        matrix = build_score_matrix(results, labels)
+        return fold_chunk_scores(song_positions, matrix, labels, mapping, len(lyrics_list))
+
+    def add_score_columns(self, dataframe):
+        # Add the empty score columns and the scoring hash to the dataframe
+        dataframe["Category"] = ""
+        dataframe["Category Score"] = 0.0
+        for label in self.labels:
+            dataframe[get_probability_column(label)] = 0.0
+        dataframe["Scoring Hash"] = self.scoring_hash
+        return dataframe
+
+    def get_score_columns(self):
+        # Names of the columns written by score_rows
+        return ["Category", "Category Score"] + [get_probability_column(label) for label in self.labels]
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+def get_lyrics_hash(lyrics):
+    # Hash the filtered lyrics of a song
+    return hashlib.sha256(lyrics.encode("utf-8")).hexdigest()
+
+def prepare_lyrics(dataframe, remove_love, remove_singing, extra_words=None):
     # If the dataframe has a column with "Lyrics" change it to "lyrics"
     if "Lyrics" in dataframe.columns:
         dataframe.rename(columns={"Lyrics": "lyrics"}, inplace=True)
 
     # perform word removal
-    if remove_love:
-        dataframe["lyrics"] = dataframe["lyrics"].fillna("").apply(lambda x: re.sub(r"\b" + "love" + r"\b", "", x, flags=re.IGNORECASE))
-    if remove_singing:
-        for word in singing:
-            pattern = r"\b" + word + r"\b"
-            dataframe["lyrics"] = dataframe["lyrics"].fillna("").apply(lambda x: re.sub(pattern, "", x, flags=re.IGNORECASE))
-
-
-    # Add two new columns to the dataframe: "Sentiment" and "Sentiment Score"
-    dataframe["Category"] = ""
-    dataframe["Category Score"] = 0.0
-
-    # For each row in the dataframe, get the sentiment and the sentiment score for the lyrics
-    for index, row in tqdm(dataframe.iterrows(), total=len(dataframe)):
-        lyrics = row["lyrics"]
-        
-        # Split the lyrics into chunks using the split_lyrics function
-        chunks = split_lyrics(lyrics)
-        
-        # Initialize variables to store cumulative scores and total count for averaging
-        cumulative_score = 0
-        total_chunks = len(chunks)
-        
-        # Analyze the sentiment of each chunk
-        for chunk in chunks:
-            sentiments = classifier(chunk, candidate_labels=labels)
-            chunk_score = 0
-            for label, score in zip(sentiments["labels"], sentiments["scores"]):
-                chunk_score += score * mapping[label]
-            # Update cumulative score with the weighted chunk score
-            cumulative_score += chunk_score
-
-        # Calculate the average score for the song and assign it to the dataframe
-        final_score = cumulative_score / total_chunks if total_chunks > 0 else 0
-        dataframe.at[index, "Category Score"] = final_score
-        # Set the category based on the final score using the mapping dictionary
-        # Find the number closest to the final score in the mapping dictionary
-        closest_score = min(mapping.values(), key=lambda x:abs(x-final_score))
-        # Get the category corresponding to the closest score
-        category = [key for key, value in mapping.items() if value == closest_score][0]
-        # Assign the category to the dataframe
-        dataframe.at[index, "Category"] = category
-        
+    dataframe["lyrics"], removed_counts = filter_lyrics(dataframe["lyrics"], remove_love, remove_singing, extra_words)
+    if len(removed_counts) > 0:
+        print("Removed words: " + ", ".join(f"{word} ({count})" for word, count in removed_counts.most_common()))
+
+    # Hash the lyrics so later runs can tell which songs changed
+    dataframe["Lyrics Hash"] = dataframe["lyrics"].fillna("").map(get_lyrics_hash)
+    return dataframe
+
+def reuse_previous_scores(dataframe, previous_results_path, scoring_hash, score_columns):
+    '''
+    This function copies the scores of unchanged songs from a previous results file
+    :param dataframe: The songs to score
+    :type dataframe: pd.DataFrame
+    :param previous_results_path: The path of a previous sentiment analysis csv
+    :type previous_results_path: str
+    :param scoring_hash: The hash of the current scoring settings
+    :type scoring_hash: str
+    :param score_columns: The columns to copy from the previous results
+    :type score_columns: list
+
+    :return: A boolean mask of the rows that still have to be scored
+    :rtype: pd.Series
+    '''
+    previous = load_dataset(previous_results_path)
+    # Files written before the hashes were stored can't be reused
+    if "Lyrics Hash" not in previous.columns or "Scoring Hash" not in previous.columns:
+        print("Previous results have no hashes, scoring every song.")
+        return pd.Series(True, index=dataframe.index)
+    # Keep only the previous rows scored with the same settings
+    previous = previous[previous["Scoring Hash"] == scoring_hash].drop_duplicates("Lyrics Hash")
+    previous = previous.set_index("Lyrics Hash")
+    # Copy the scores of the songs whose lyrics haven't changed
+    found = dataframe["Lyrics Hash"].isin(previous.index)
+    for column in score_columns:
+        if column in previous.columns:
+            dataframe.loc[found, column] = dataframe.loc[found, "Lyrics Hash"].map(previous[column]).values
+    print(f"Reusing {found.sum()} previous scores, scoring {(~found).sum()} songs.")
+    return ~found
+
+def perform_sentiment_analysis(labels, mapping, data_path, remove_love, remove_singing, batch_size=None, cache_path=None, cache_max_entries=1000000, workers=None, threads_per_worker=1, model_name=None, chunk_size=512, token_chunks=False, chunk_overlap=0, extra_words=None, previous_results_path=None, backend="zero-shot", dedup_threshold=None):
+    # Create the scorer holding the model and the scoring settings
+    scorer = SentimentScorer(labels, mapping, batch_size, cache_path, cache_max_entries, workers, threads_per_worker, model_name, chunk_size, token_chunks, chunk_overlap, backend, dedup_threshold)
+
+    # Get the data from the csv file or the corpus store
+    dataframe = load_dataset(data_path)
+
+    # Rename the lyrics column, remove the unwanted words and hash the lyrics
+    dataframe = prepare_lyrics(dataframe, remove_love, remove_singing, extra_words)
+
+    # Add the new columns to the dataframe: "Category", "Category Score" and the label probabilities
+    dataframe = scorer.add_score_columns(dataframe)
+
+    # In incremental mode only the new or changed songs are scored
+    if previous_results_path is not None:
+        score_columns = scorer.get_score_columns()
+        to_score = reuse_previous_scores(dataframe, previous_results_path, scorer.scoring_hash, score_columns)
+        scored = scorer.score_rows(dataframe[to_score].copy())
+        dataframe.loc[to_score, score_columns] = scored[score_columns]
+    else:
+        dataframe = scorer.score_rows(dataframe)
+
+    scorer.close()
     # return the dataframe
     return dataframe
+
+def get_file_hash(path):
+    # Hash of the contents of a file, read in blocks
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_progress_path(output_path):
+    # The progress of a streamed output is kept next to it
+    return output_path + ".progress.json"
+
+def read_progress(output_path):
+    # Get the progress of a previous run, None if the output was never started
+    progress_path = get_progress_path(output_path)
+    if not os.path.exists(progress_path):
+        return None
+    with open(progress_path, "r") as file:
+        return json.load(file)
+
+def write_progress(output_path, progress):
+    # Write the progress to a temporary file and rename it, so it is never half written
+    progress_path = get_progress_path(output_path)
+    with open(progress_path + ".tmp", "w") as file:
+        json.dump(progress, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(progress_path + ".tmp", progress_path)
+
+def stream_sentiment_analysis(scorer, data_path, output_path, remove_love, remove_singing, extra_words=None, rows_per_batch=100):
+    '''
+    This function scores the csv in batches of rows and appends every batch to the output
+    The byte offset and the number of rows of the output are saved after every batch, a run stopped during a write is
+    cut back to the last saved batch when it is resumed
+    :param scorer: The scorer holding the model and the scoring settings
+    :type scorer: SentimentScorer
+    :param data_path: The path of the csv with the lyrics
+    :type data_path: str
+    :param output_path: The path of the output csv, an existing file is resumed if it was made from the same csv
+    :type output_path: str
+    :param rows_per_batch: The number of rows read, scored and written together
+    :type rows_per_batch: int
+
+    :return: The number of rows scored in this run
+    :rtype: int
+    '''
+    data_hash = get_file_hash(data_path)
+    progress = read_progress(output_path)
+    if progress is None:
+        # Never overwrite an output whose progress is unknown
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            raise ValueError(f"{output_path} exists without a progress file, choose another output path")
+        progress = {"data_path": os.path.abspath(data_path), "data_hash": data_hash, "offset": 0, "rows": 0}
+        write_progress(output_path, progress)
+    elif progress["data_hash"] != data_hash:
+        raise ValueError(f"{output_path} was started from {progress['data_path']}, not from {data_path}, choose another output path")
+    completed = progress["rows"]
+    if completed > 0:
+        print(f"Resuming after {completed} completed rows.")
+    # Remove what a stopped run wrote after the last saved batch
+    with open(output_path, "ab") as file:
+        file.truncate(progress["offset"])
+    scored_rows = 0
+    # Skip the completed rows (the header is line 0) and read the rest in batches
+    reader = pd.read_csv(data_path, skiprows=range(1, completed + 1), chunksize=rows_per_batch)
+    with open(output_path, "ab") as file:
+        for batch in reader:
+            # Prepare and score the batch like a whole file
+            batch = prepare_lyrics(batch, remove_love, remove_singing, extra_words)
+            batch = scorer.add_score_columns(batch)
+            batch = scorer.score_rows(batch)
+            # Write the whole batch and flush it to disk before saving the progress
+            file.write(batch.to_csv(index=False, header=(completed + scored_rows == 0)).encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+            scored_rows += len(batch)
+            progress["offset"] = file.tell()
+            progress["rows"] = completed + scored_rows
+            write_progress(output_path, progress)
+    scorer.close()
+    return scored_rows
     
 
 
@@ -95,18 +548,76 @@ if __name__ == "__main__":
         'positive': 0.5,
         'very positive': 1
     }
+    # Additional words to remove from the lyrics before scoring
+    extra_words = []
+    # Scoring backend: "zero-shot" (the original model), "quantized" (distilled int8 model),
+    # "lexicon" (VADER rules, pip install vaderSentiment) or "stub" (deterministic fake scores for offline tests),
+    # model_name None uses the default model of the backend
+    backend = "zero-shot"
+    model_name = None
+    # Number of chunks sent through the model together (None scores one chunk at a time)
+    batch_size = 16
+    # Path of the chunk score cache (None disables it) and the maximum number of cached chunks
+    cache_path = "sentiment_scores/chunk_score_cache.sqlite"
+    cache_max_entries = 1000000
+    # Number of worker processes, each with its own model (None scores in this process)
+    workers = None
+    # Number of torch threads used by every worker process
+    threads_per_worker = 1
+    # Maximum chunk length, in model tokens if token_chunks is True and in characters otherwise
+    chunk_size = 512
+    token_chunks = False
+    # Number of words repeated between consecutive chunks
+    chunk_overlap = 0
+    # Songs with at least this Jaccard similarity of their lyrics are scored once (None scores every song),
+    # use the corpus store as data path to group the songs of every artist together
+    dedup_threshold = None
+    # Path of a previous results file to only score new or changed songs (None scores everything)
+    previous_results_path = None
+    # Stream the file in batches of rows, appending to (and resuming) stream_output_path,
+    # None names the output after the data file
+    streaming = False
+    rows_per_batch = 100
+    stream_output_path = None
+    # Corpus store the results are also written to, replacing the scores of the same artists (None only writes the csv file)
+    corpus_output_path = None
+    # Artist of the songs when the data has no artist_name column (the beatles data)
+    corpus_artist_name = "The Beatles"
     # Get path from the user
     data_path = input("Enter the path to the data file: ")
     # Check it exists if not print message and exit
     if not os.path.exists(data_path):
         print("File does not exist.")
         exit()
+    # Check the previous results exist
+    if previous_results_path is not None and not os.path.exists(previous_results_path):
+        print("Previous results file does not exist.")
+        exit()
+
+    # Stream the file in batches of rows if requested
+    if streaming:
+        # Only csv files can be read and resumed row by row
+        if os.path.isdir(data_path):
+            print("Streaming needs a csv file, not a corpus store.")
+            exit()
+        if stream_output_path is None:
+            stream_output_path = f"sentiment_scores/sentiment_analysis_stream_{os.path.splitext(os.path.basename(data_path))[0]}.csv"
+        scorer = SentimentScorer(my_labels, mapping, batch_size, cache_path, cache_max_entries, workers, threads_per_worker, model_name, chunk_size, token_chunks, chunk_overlap, backend, dedup_threshold)
+        scored_rows = stream_sentiment_analysis(scorer, data_path, stream_output_path, remove_love=False, remove_singing=True, extra_words=extra_words, rows_per_batch=rows_per_batch)
+        print(f"Scored {scored_rows} rows into {stream_output_path}.")
+        exit()
     
     # Perform sentiment analysis
-    result = perform_sentiment_analysis(my_labels, mapping, data_path, remove_love=False, remove_singing=True)
+    result = perform_sentiment_analysis(my_labels, mapping, data_path, remove_love=False, remove_singing=True, batch_size=batch_size, cache_path=cache_path, cache_max_entries=cache_max_entries, workers=workers, threads_per_worker=threads_per_worker, chunk_size=chunk_size, token_chunks=token_chunks, chunk_overlap=chunk_overlap, extra_words=extra_words, previous_results_path=previous_results_path, model_name=model_name, backend=backend, dedup_threshold=dedup_threshold)
 
     # Get the time and date for a unique filename
     now = datetime.datetime.now()
 
     # Save the result to a new CSV file
     result.to_csv(f"sentiment_scores/sentiment_analysis_{now.strftime('%Y-%m-%d_%H-%M-%S')}.csv", index=False)
+    # Save it to the corpus store too if requested
+    if corpus_output_path is not None:
+        # The result has the filtered lyrics, the store keeps the original lyrics next to the scores
+        from data_gathering_helpers.corpus_store import write_corpus
+        original_lyrics = load_dataset(data_path).rename(columns={"Lyrics": "lyrics"})["lyrics"]
+        write_corpus(result.assign(lyrics=original_lyrics.to_numpy()), corpus_output_path, corpus_artist_name)
@@ -0,0 +1,123 @@
+# Imports
+import json
+import hashlib
+
+# Default model of every backend
+default_models = {
+    "zero-shot": "facebook/bart-large-mnli",
+    "quantized": "valhalla/distilbart-mnli-12-1",
+    "lexicon": "vader",
+    "stub": "stub",
+}
+
+class ZeroShotBackend:
+    def __init__(self, model_name="facebook/bart-large-mnli"):
+        # Load the zero-shot pipeline
+        from transformers import pipeline
+        self.classifier = pipeline("zero-shot-classification", model=model_name)
+        self.model_name = model_name
+
+    def __call__(self, chunks, candidate_labels, batch_size=None):
+        # Score one chunk or a list of chunks, like the pipeline itself
+        if batch_size is None:
+            return self.classifier(chunks, candidate_labels=candidate_labels)
+        # The pipeline batches (chunk, label) pairs, so a batch of chunks is one pair per label of every chunk
+        return self.classifier(chunks, candidate_labels=candidate_labels, batch_size=batch_size * len(candidate_labels))
+
+class QuantizedZeroShotBackend(ZeroShotBackend):
+    def __init__(self, model_name="valhalla/distilbart-mnli-12-1"):
+        # Load a (preferably distilled) zero-shot pipeline
+        super().__init__(model_name)
+        # Replace the linear layers with dynamic int8 versions for faster CPU inference
+        import torch
+        self.classifier.model = torch.quantization.quantize_dynamic(self.classifier.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class LexiconBackend:
+    def __init__(self, mapping):
+        # VADER ships its lexicon inside the package, so nothing is downloaded
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        self.analyzer = SentimentIntensityAnalyzer()
+        self.mapping = mapping
+        self.model_name = "vader"
+
+    def __call__(self, chunks, candidate_labels, batch_size=None):
+        # Score one chunk or a list of chunks, like the pipeline
+        if isinstance(chunks, str):
+            return self.score_chunk(chunks, candidate_labels)
+        return [self.score_chunk(chunk, candidate_labels) for chunk in chunks]
+
+    def score_chunk(self, chunk, labels):
+        '''
+        This function turns the VADER compound score of a chunk into label scores
+        :param chunk: The chunk of lyrics
+        :type chunk: str
+        :param labels: The candidate labels
+        :type labels: list
+
+        :return: The chunk in the zero-shot pipeline output format
+        :rtype: dict
+        '''
+        compound = self.analyzer.polarity_scores(chunk)["compound"]
+        # Order the labels by their value in the mapping and clip the compound score to that range
+        ordered = sorted(labels, key=lambda label: self.mapping[label])
+        values = [self.mapping[label] for label in ordered]
+        compound = min(max(compound, values[0]), values[-1])
+        # Split the score between the two labels around the compound score,
+        # so the weighted chunk score is the compound score itself
+        scores = {label: 0.0 for label in ordered}
+        scores[ordered[0]] = 1.0
+        for i in range(len(values) - 1):
+            if values[i] <= compound <= values[i + 1] and values[i + 1] > values[i]:
+                weight = (compound - values[i]) / (values[i + 1] - values[i])
+                scores[ordered[0]] = 0.0
+                scores[ordered[i]] = 1 - weight
+                scores[ordered[i + 1]] = weight
+                break
+        # Sort from the highest score like the pipeline does
+        pairs = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+        return {"sequence": chunk, "labels": [label for label, _ in pairs], "scores": [score for _, score in pairs]}
+
+class StubBackend:
+    def __init__(self):
+        # Deterministic scores without any model, for offline runs and benchmarks
+        self.model_name = "stub"
+
+    def __call__(self, chunks, candidate_labels, batch_size=None):
+        # Score one chunk or a list of chunks, like the pipeline
+        if isinstance(chunks, str):
+            return self.score_chunk(chunks, candidate_labels)
+        return [self.score_chunk(chunk, candidate_labels) for chunk in chunks]
+
+    def score_chunk(self, chunk, labels):
+        # Derive the label scores from the hash of the chunk
+        digest = hashlib.md5(chunk.encode("utf-8")).digest()
+        weights = [digest[i % len(digest)] + 1 for i in range(len(labels))]
+        total = sum(weights)
+        pairs = sorted(zip(labels, [weight / total for weight in weights]), key=lambda pair: pair[1], reverse=True)
+        return {"sequence": chunk, "labels": [label for label, _ in pairs], "scores": [score for _, score in pairs]}
+
+def create_backend(backend, model_name=None, mapping=None):
+    # Create the backend with the given name
+    if model_name is None:
+        model_name = default_models[backend]
+    if backend == "zero-shot":
+        return ZeroShotBackend(model_name)
+    elif backend == "quantized":
+        return QuantizedZeroShotBackend(model_name)
+    elif backend == "lexicon":
+        return LexiconBackend(mapping)
+    elif backend == "stub":
+        return StubBackend()
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+def get_cache_name(backend, model_name=None, mapping=None):
+    # Name used to key the cached chunk scores of a backend
+    if model_name is None:
+        model_name = default_models[backend]
+    if backend == "quantized":
+        return model_name + "-int8"
+    elif backend == "lexicon":
+        # The lexicon label scores depend on the mapping
+        return model_name + "-" + json.dumps(mapping, sort_keys=True)
+    return model_name
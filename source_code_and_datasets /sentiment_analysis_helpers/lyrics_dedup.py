@@ -0,0 +1,87 @@
+# Imports
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+
+# Prime of the MinHash permutations, every shingle hash is reduced below it
+prime = (1 << 31) - 1
+
+def get_shingles(lyrics, shingle_size=5):
+    # The set of word shingles of the lyrics, songs shorter than a shingle are one shingle
+    if not isinstance(lyrics, str):
+        return set()
+    words = re.findall(r"[a-z0-9']+", lyrics.lower())
+    if len(words) == 0:
+        return set()
+    if len(words) < shingle_size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+
+class LyricsDeduplicator:
+    def __init__(self, threshold=0.9, shingle_size=5, num_perm=128, bands=32, seed=0):
+        '''
+        This class groups the songs with near-identical lyrics, using MinHash signatures and LSH buckets
+        :param threshold: The smallest Jaccard similarity of the shingles of two songs of a group
+        :type threshold: float
+        :param shingle_size: The number of words of a shingle
+        :type shingle_size: int
+        :param num_perm: The length of the MinHash signatures
+        :type num_perm: int
+        :param bands: The number of LSH bands, each of num_perm / bands values
+        :type bands: int
+        '''
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+        # The random permutations (a * x + b) mod prime
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, prime, size=num_perm).astype(np.uint64)
+        self.b = generator.randint(0, prime, size=num_perm).astype(np.uint64)
+
+    def get_signature(self, shingles):
+        # Minimum of every permutation over the hashes of the shingles
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) % prime for shingle in shingles], dtype=np.uint64)
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % prime).min(axis=1)
+
+    def find_groups(self, lyrics):
+        '''
+        This function finds the representative song of every song
+        :param lyrics: The lyrics of every song
+        :type lyrics: list
+
+        :return: The position of the representative (the first song of its group) of every song,
+        every song is at least threshold similar to its representative
+        :rtype: np.ndarray
+        '''
+        shingles = [get_shingles(text, self.shingle_size) for text in lyrics]
+        # Songs with the same band of signature values land in the same bucket
+        buckets = defaultdict(list)
+        for position, song_shingles in enumerate(shingles):
+            if len(song_shingles) == 0:
+                continue
+            signature = self.get_signature(song_shingles)
+            for band in range(self.bands):
+                buckets[(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())].append(position)
+        # Candidate neighbours of every song: the songs sharing at least one bucket with it
+        candidates = defaultdict(set)
+        for positions in buckets.values():
+            for position in positions:
+                candidates[position].update(positions)
+        # Leader clustering: the first song not in a group starts one, and only takes the candidates similar to itself,
+        # so every song is similar to the representative whose score it gets (no chains of similar pairs)
+        representatives = np.arange(len(lyrics))
+        grouped = np.zeros(len(lyrics), dtype=bool)
+        for leader in range(len(lyrics)):
+            if grouped[leader]:
+                continue
+            grouped[leader] = True
+            for position in sorted(candidates[leader]):
+                if grouped[position]:
+                    continue
+                intersection = len(shingles[leader] & shingles[position])
+                if intersection / (len(shingles[leader]) + len(shingles[position]) - intersection) >= self.threshold:
+                    representatives[position] = leader
+                    grouped[position] = True
+        return representatives
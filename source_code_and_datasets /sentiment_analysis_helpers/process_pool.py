@@ -0,0 +1,69 @@
+# Imports
+import multiprocessing
+from tqdm import tqdm
+
+# My classes
+from sentiment_analysis_helpers.backends import create_backend
+
+# The classifier of the current worker process, loaded once by init_worker
+worker_classifier = None
+
+def init_worker(backend, model_name, mapping, threads_per_worker):
+    # Limit the torch threads so the workers don't fight over the cores
+    if backend not in ["lexicon", "stub"]:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    # Load the model once for the whole life of the worker
+    global worker_classifier
+    worker_classifier = create_backend(backend, model_name, mapping)
+
+def score_shard(shard):
+    # Unpack the shard and score its chunks with the worker's classifier
+    positions, chunks, labels, batch_size = shard
+    sentiments = worker_classifier(chunks, candidate_labels=labels, batch_size=batch_size)
+    # The pipeline returns a dict instead of a list when given a single chunk
+    if isinstance(sentiments, dict):
+        sentiments = [sentiments]
+    return positions, sentiments
+
+def score_chunks_in_processes(chunks, labels, backend, model_name, mapping, batch_size, workers, threads_per_worker=1, on_shard_done=None):
+    '''
+    This function scores chunks with a pool of processes, each holding its own model
+    :param chunks: The chunks of lyrics
+    :type chunks: list
+    :param labels: The candidate labels given to the classifier
+    :type labels: list
+    :param backend: The name of the scoring backend created by every worker
+    :type backend: str
+    :param model_name: The name of the model loaded by every worker, None for the backend default
+    :type model_name: str
+    :param mapping: The mapping from labels to scores, used by the lexicon backend
+    :type mapping: dict
+    :param batch_size: The number of chunks in every shard given to a worker
+    :type batch_size: int
+    :param workers: The number of worker processes
+    :type workers: int
+    :param threads_per_worker: The number of torch threads used by every worker
+    :type threads_per_worker: int
+    :param on_shard_done: Optional function called with the chunks and results of every finished shard
+    :type on_shard_done: function
+
+    :return: A list with the classifier output of every chunk, in the original order
+    :rtype: list
+    '''
+    # Split the chunks into shards, keeping the position of every chunk
+    shards = []
+    for start in range(0, len(chunks), batch_size):
+        positions = list(range(start, min(start + batch_size, len(chunks))))
+        shards.append((positions, [chunks[i] for i in positions], labels, batch_size))
+    results = [None] * len(chunks)
+    # Spawn fresh processes so no torch state is shared with the parent
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=init_worker, initargs=(backend, model_name, mapping, threads_per_worker)) as pool:
+        # The workers take the shards from the pool's queue as soon as they are free
+        for positions, sentiments in tqdm(pool.imap_unordered(score_shard, shards), total=len(shards)):
+            for position, chunk_sentiments in zip(positions, sentiments):
+                results[position] = chunk_sentiments
+            if on_shard_done is not None:
+                on_shard_done([chunks[i] for i in positions], sentiments)
+    return results
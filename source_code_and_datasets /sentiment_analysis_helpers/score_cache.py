@@ -0,0 +1,119 @@
+# Imports
+import sqlite3
+import hashlib
+import json
+import time
+
+class ScoreCache:
+    def __init__(self, path, model_name, max_entries=1000000):
+        # Save the configuration
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        # Open the database and create the table if it doesn't exist yet
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_scores ("
+            "key TEXT PRIMARY KEY, "
+            "model_name TEXT, "
+            "labels TEXT, "
+            "text_hash TEXT, "
+            "scores TEXT, "
+            "last_used REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS last_used_index ON chunk_scores (last_used)")
+        self.connection.commit()
+
+    def get_key(self, chunk, labels):
+        '''
+        This function builds the cache key of a chunk
+        :param chunk: The chunk of lyrics
+        :type chunk: str
+        :param labels: The candidate labels given to the classifier
+        :type labels: list
+
+        :return: The key, the hash of the chunk text
+        :rtype: str
+        :rtype: str
+        '''
+        text_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+        key = hashlib.sha256(json.dumps([self.model_name, list(labels), text_hash]).encode("utf-8")).hexdigest()
+        return key, text_hash
+
+    def get_many(self, chunks, labels):
+        '''
+        This function looks up the scores of several chunks at once
+        :param chunks: The chunks of lyrics
+        :type chunks: list
+        :param labels: The candidate labels given to the classifier
+        :type labels: list
+
+        :return: A list with the classifier style output of every chunk, None where it is not cached
+        :rtype: list
+        '''
+        keys = [self.get_key(chunk, labels)[0] for chunk in chunks]
+        found = {}
+        # Query in slices to stay under the sqlite variable limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(f"SELECT key, scores FROM chunk_scores WHERE key IN ({placeholders})", batch)
+            for key, scores in rows:
+                found[key] = json.loads(scores)
+        # Refresh the last used time of the hits so they are evicted last
+        now = time.time()
+        self.connection.executemany("UPDATE chunk_scores SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+        self.connection.commit()
+        # Convert the stored scores back into the classifier output format
+        results = []
+        for chunk, key in zip(chunks, keys):
+            if key in found:
+                scores = found[key]
+                results.append({"sequence": chunk, "labels": list(scores.keys()), "scores": list(scores.values())})
+            else:
+                results.append(None)
+        return results
+
+    def get(self, chunk, labels):
+        # Look up a single chunk
+        return self.get_many([chunk], labels)[0]
+
+    def put_many(self, chunks, labels, results):
+        '''
+        This function stores the classifier output of several chunks
+        :param chunks: The chunks of lyrics
+        :type chunks: list
+        :param labels: The candidate labels given to the classifier
+        :type labels: list
+        :param results: The classifier output of every chunk
+        :type results: list
+        '''
+        now = time.time()
+        rows = []
+        for chunk, sentiments in zip(chunks, results):
+            key, text_hash = self.get_key(chunk, labels)
+            scores = dict(zip(sentiments["labels"], sentiments["scores"]))
+            rows.append((key, self.model_name, json.dumps(list(labels)), text_hash, json.dumps(scores), now))
+        self.connection.executemany("INSERT OR REPLACE INTO chunk_scores VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.connection.commit()
+        # Keep the cache under its size limit
+        self.evict()
+
+    def put(self, chunk, labels, sentiments):
+        # Store a single chunk
+        self.put_many([chunk], labels, [sentiments])
+
+    def evict(self):
+        # Remove the least recently used entries above the size limit
+        if self.max_entries is None:
+            return
+        count = self.connection.execute("SELECT COUNT(*) FROM chunk_scores").fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM chunk_scores WHERE key IN (SELECT key FROM chunk_scores ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()